@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Acompanhamento dos pedidos ao vivo da Pastelaria Web (Server-Sent Events)
+
+A página /pedido/<id>/acompanhar abre uma conexão EventSource com este
+processo, que a mantém aberta e envia um evento "estado" sempre que o status
+ou a previsão do pedido mudam. As conexões ficam paradas em um único loop
+asyncio, sem prender os workers do gunicorn: milhares de clientes custam só
+memória e descritores de arquivo.
+
+Não há consulta por cliente: a cada ACOMPANHAMENTO_INTERVALO segundos este
+processo lê a versão 'pedidos' de cada loja (uma linha) e, só quando ela muda
+(ou a cada ACOMPANHAMENTO_RECALCULO segundos, porque a previsão anda com o
+relógio), calcula de uma vez o estado de todos os pedidos acompanhados.
+
+O acesso é pelo token assinado que o app coloca na página (loja e pedido).
+
+Uso:
+    python acompanhamento.py                # escuta em 0.0.0.0:5001
+    python acompanhamento.py --porta 5002
+
+Em produção o nginx encaminha ACOMPANHAMENTO_URL (/acompanhar/eventos) para cá.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import urllib.parse
+
+# Pedidos consultados por comando SQL (limite de parâmetros do SQLite)
+LOTE_CONSULTA = 500
+
+CABECALHO_EVENTOS = (b'HTTP/1.1 200 OK\r\n'
+                     b'Content-Type: text/event-stream; charset=utf-8\r\n'
+                     b'Cache-Control: no-store\r\n'
+                     b'X-Accel-Buffering: no\r\n'
+                     b'Connection: close\r\n\r\n'
+                     b'retry: 5000\n\n')
+NAO_ENCONTRADO = (b'HTTP/1.1 404 Not Found\r\n'
+                  b'Content-Length: 0\r\n'
+                  b'Connection: close\r\n\r\n')
+
+
+class Central:
+    """Guarda as conexões abertas por pedido e distribui os estados que mudaram.
+
+    `versao(loja)` e `consultar(loja, ids)` são funções síncronas (rodam em
+    threads); `ler_token(token)` devolve (loja, pedido_id) ou None.
+    """
+
+    def __init__(self, versao, consultar, ler_token, config):
+        self.versao = versao
+        self.consultar = consultar
+        self.ler_token = ler_token
+        self.caminho = urllib.parse.urlsplit(config['ACOMPANHAMENTO_URL']).path
+        self.intervalo = config['ACOMPANHAMENTO_INTERVALO']
+        self.recalculo = config['ACOMPANHAMENTO_RECALCULO']
+        self.batimento = config['ACOMPANHAMENTO_BATIMENTO']
+        self.inscritos = {} # loja -> {pedido_id: {filas das conexões}}
+        self.ultimos = {} # (loja, pedido_id) -> último estado publicado
+        self.versoes = {} # loja -> versão 'pedidos' do último cálculo
+
+    def _inscrever(self, loja, pedido_id, fila):
+        self.inscritos.setdefault(loja, {}).setdefault(pedido_id, set()).add(fila)
+
+    def _desinscrever(self, loja, pedido_id, fila):
+        filas = self.inscritos.get(loja, {}).get(pedido_id)
+        if filas is None:
+            return
+        filas.discard(fila)
+        if not filas:
+            del self.inscritos[loja][pedido_id]
+            self.ultimos.pop((loja, pedido_id), None)
+
+    @staticmethod
+    def _entregar(fila, estado):
+        # Cada conexão só precisa do estado mais recente
+        if fila.full():
+            fila.get_nowait()
+        fila.put_nowait(estado)
+
+    def publicar(self, loja, pedido_id, estado):
+        """Envia o estado às conexões do pedido, se ele mudou desde o último envio."""
+        if self.ultimos.get((loja, pedido_id)) == estado:
+            return
+        self.ultimos[(loja, pedido_id)] = estado
+        for fila in self.inscritos.get(loja, {}).get(pedido_id, ()):
+            self._entregar(fila, estado)
+
+    async def vigiar(self):
+        """Laço que detecta mudanças nas lojas com pedidos acompanhados."""
+        ultimo_recalculo = time.monotonic()
+        while True:
+            await asyncio.sleep(self.intervalo)
+            recalcular = time.monotonic() - ultimo_recalculo >= self.recalculo
+            for loja, pedidos in list(self.inscritos.items()):
+                if not pedidos:
+                    continue
+                try:
+                    versao = await asyncio.to_thread(self.versao, loja)
+                    if versao == self.versoes.get(loja) and not recalcular:
+                        continue
+                    estados = await asyncio.to_thread(self.consultar, loja, list(pedidos))
+                except Exception as e:
+                    print(f'⚠️  Erro ao consultar a loja {loja}: {type(e).__name__}: {e}')
+                    continue
+                self.versoes[loja] = versao
+                for pedido_id, estado in estados.items():
+                    self.publicar(loja, pedido_id, estado)
+            if recalcular:
+                ultimo_recalculo = time.monotonic()
+
+    async def _ler_requisicao(self, leitor):
+        """(método, alvo) da requisição HTTP; os cabeçalhos são descartados."""
+        linha = await asyncio.wait_for(leitor.readline(), 10)
+        metodo, alvo, _ = linha.decode('latin-1').split(' ', 2)
+        for _ in range(100):
+            if (await asyncio.wait_for(leitor.readline(), 10)).strip() == b'':
+                break
+        return metodo, alvo
+
+    async def atender(self, leitor, escritor):
+        """Uma conexão EventSource: envia o estado atual e depois cada mudança."""
+        chave = None
+        fila = asyncio.Queue(maxsize=1)
+        try:
+            metodo, alvo = await self._ler_requisicao(leitor)
+            url = urllib.parse.urlsplit(alvo)
+            if metodo == 'GET' and url.path == self.caminho:
+                chave = self.ler_token(urllib.parse.parse_qs(url.query).get('t', [''])[0])
+            estado = None
+            if chave is not None:
+                estado = self.ultimos.get(chave) or \
+                    (await asyncio.to_thread(self.consultar, chave[0], [chave[1]])).get(chave[1])
+            if estado is None:
+                chave = None
+                escritor.write(NAO_ENCONTRADO)
+                return
+            self._inscrever(*chave, fila)
+            escritor.write(CABECALHO_EVENTOS)
+            self._entregar(fila, estado)
+            self.publicar(*chave, estado)
+            while True:
+                try:
+                    estado = await asyncio.wait_for(fila.get(), self.batimento)
+                except asyncio.TimeoutError:
+                    # Comentário SSE: mantém a conexão (e os proxies) abertos e detecta quem saiu
+                    escritor.write(b': batimento\n\n')
+                    await escritor.drain()
+                    continue
+                escritor.write(f'event: estado\ndata: {json.dumps(estado)}\n\n'.encode())
+                await escritor.drain()
+                if estado['final']:
+                    return
+        except (ConnectionError, asyncio.TimeoutError, ValueError):
+            pass
+        finally:
+            if chave is not None:
+                self._desinscrever(*chave, fila)
+            escritor.close()
+
+    async def servir(self, host, porta):
+        servidor = await asyncio.start_server(self.atender, host, porta, backlog=1024)
+        print(f'📡 Acompanhamento de pedidos escutando em {host}:{porta}{self.caminho}')
+        async with servidor:
+            await asyncio.gather(servidor.serve_forever(), self.vigiar())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Envia ao vivo o status e a previsão dos pedidos (SSE).')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--porta', type=int, default=5001)
+    args = parser.parse_args()
+
+    from app import (app, contexto_loja, criar_tabelas, versao_atual, estados_acompanhamento,
+                     ler_token_acompanhamento)
+
+    with app.app_context():
+        criar_tabelas()
+
+    def versao(loja):
+        with contexto_loja(loja):
+            return versao_atual('pedidos')
+
+    def consultar(loja, pedido_ids):
+        estados = {}
+        with contexto_loja(loja):
+            for i in range(0, len(pedido_ids), LOTE_CONSULTA):
+                estados.update(estados_acompanhamento(pedido_ids[i:i + LOTE_CONSULTA]))
+        return estados
+
+    central = Central(versao, consultar, ler_token_acompanhamento, app.config)
+    try:
+        asyncio.run(central.servir(args.host, args.porta))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
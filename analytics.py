@@ -0,0 +1,173 @@
+"""
+Relatórios analíticos da Pastelaria Web
+
+Os relatórios pesados (receita por hora da semana, mix de produtos por dia da
+semana e taxa de recompra dos clientes) rodam em um pool de processos separado
+dos workers do gunicorn. Cada job lê os pedidos direto do arquivo SQLite em
+lotes colunares, agrega com operações vetorizadas do NumPy e grava o resultado
+em JSON na tabela relatorio_analitico, que funciona como cache.
+
+Este módulo não importa o app: os processos do pool só precisam do caminho do
+banco e dos parâmetros do relatório.
+"""
+
+import datetime
+import json
+import multiprocessing
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+DIAS_SEMANA = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+
+TAMANHO_LOTE = 100000
+
+# Pedidos cancelados não entram em nenhum relatório
+FILTRO_PEDIDOS = "p.status != 'Cancelado' AND p.data_pedido >= ? AND p.data_pedido < ?"
+
+_pool = None
+
+
+# --- LEITURA EM LOTES COLUNARES ---
+
+def _lotes(conexao, sql, parametros, colunas):
+    """Executa a consulta e devolve os resultados em lotes, uma matriz NumPy por lote."""
+    cursor = conexao.execute(sql, parametros)
+    while True:
+        linhas = cursor.fetchmany(TAMANHO_LOTE)
+        if not linhas:
+            break
+        yield np.array(linhas, dtype=np.float64).reshape(-1, colunas)
+
+
+def _hora_e_dia(epoch, fuso_horas):
+    """Converte segundos desde 1970 (UTC) em (hora do dia, dia da semana com segunda=0)."""
+    local = epoch.astype(np.int64) + fuso_horas * 3600
+    hora = (local // 3600) % 24
+    # 01/01/1970 foi uma quinta-feira (índice 3)
+    dia = (local // 86400 + 3) % 7
+    return hora, dia
+
+
+# --- RELATÓRIOS ---
+
+def receita_hora_semana(conexao, inicio, fim, fuso_horas):
+    """Receita e quantidade de pedidos em uma grade dia da semana x hora."""
+    receita = np.zeros(7 * 24)
+    pedidos = np.zeros(7 * 24, dtype=np.int64)
+    sql = ("SELECT CAST(strftime('%s', p.data_pedido) AS INTEGER), p.valor_total "
+           f"FROM pedido p WHERE {FILTRO_PEDIDOS}")
+    for lote in _lotes(conexao, sql, (inicio, fim), 2):
+        hora, dia = _hora_e_dia(lote[:, 0], fuso_horas)
+        celula = dia * 24 + hora
+        receita += np.bincount(celula, weights=lote[:, 1], minlength=7 * 24)
+        pedidos += np.bincount(celula, minlength=7 * 24)
+    return {
+        'dias': DIAS_SEMANA,
+        'horas': list(range(24)),
+        'receita': np.round(receita.reshape(7, 24), 2).tolist(),
+        'pedidos': pedidos.reshape(7, 24).tolist(),
+        'receita_total': round(float(receita.sum()), 2),
+        'total_pedidos': int(pedidos.sum()),
+    }
+
+
+def mix_produtos_dia_semana(conexao, inicio, fim, fuso_horas):
+    """Unidades vendidas de cada produto por dia da semana."""
+    produtos = conexao.execute('SELECT id, nome, categoria FROM produto ORDER BY categoria, nome').fetchall()
+    maior_id = max((produto_id for produto_id, _, _ in produtos), default=0)
+    quantidades = np.zeros((maior_id + 1) * 7, dtype=np.int64)
+    sql = ("SELECT CAST(strftime('%s', p.data_pedido) AS INTEGER), i.produto_id, i.quantidade "
+           f"FROM pedido p JOIN itens_pedido i ON i.pedido_id = p.id WHERE {FILTRO_PEDIDOS}")
+    for lote in _lotes(conexao, sql, (inicio, fim), 3):
+        _, dia = _hora_e_dia(lote[:, 0], fuso_horas)
+        produto = lote[:, 1].astype(np.int64)
+        validos = produto <= maior_id  # ignora itens de produtos já removidos
+        celula = produto[validos] * 7 + dia[validos]
+        quantidades += np.bincount(celula, weights=lote[validos, 2],
+                                   minlength=quantidades.size).astype(np.int64)
+    matriz = quantidades.reshape(maior_id + 1, 7)
+    return {
+        'dias': DIAS_SEMANA,
+        'produtos': [
+            {'id': produto_id, 'nome': nome, 'categoria': categoria,
+             'quantidades': matriz[produto_id].tolist(), 'total': int(matriz[produto_id].sum())}
+            for produto_id, nome, categoria in produtos
+        ],
+    }
+
+
+def recorrencia_clientes(conexao, inicio, fim, fuso_horas):
+    """Quantos clientes voltaram a comprar no período e como se distribuem os pedidos por cliente."""
+    contagem = np.zeros(0, dtype=np.int64)
+    sql = f"SELECT p.cliente_id FROM pedido p WHERE {FILTRO_PEDIDOS}"
+    for lote in _lotes(conexao, sql, (inicio, fim), 1):
+        parcial = np.bincount(lote[:, 0].astype(np.int64))
+        if parcial.size > contagem.size:
+            parcial[:contagem.size] += contagem
+            contagem = parcial
+        else:
+            contagem[:parcial.size] += parcial
+    compradores = contagem[contagem > 0]
+    faixas = [(1, 1), (2, 2), (3, 5), (6, 10), (11, None)]
+    distribuicao = []
+    for minimo, maximo in faixas:
+        mascara = compradores >= minimo
+        if maximo is not None:
+            mascara &= compradores <= maximo
+        rotulo = str(minimo) if minimo == maximo else (f'{minimo}-{maximo}' if maximo else f'{minimo}+')
+        distribuicao.append({'faixa': rotulo, 'clientes': int(mascara.sum())})
+    total = int(compradores.size)
+    recorrentes = int((compradores >= 2).sum())
+    return {
+        'clientes': total,
+        'recorrentes': recorrentes,
+        'taxa_recompra': round(recorrentes / total, 4) if total else 0.0,
+        'pedidos_por_cliente': round(float(compradores.mean()), 2) if total else 0.0,
+        'distribuicao': distribuicao,
+    }
+
+
+RELATORIOS = {
+    'receita_hora_semana': ('Receita por hora da semana', receita_hora_semana),
+    'mix_produtos_dia_semana': ('Mix de produtos por dia da semana', mix_produtos_dia_semana),
+    'recorrencia_clientes': ('Taxa de recompra dos clientes', recorrencia_clientes),
+}
+
+
+# --- EXECUÇÃO NO POOL DE PROCESSOS ---
+
+def _agora():
+    return datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def executar_job(caminho_banco, job_id, relatorio, inicio, fim, fuso_horas):
+    """Roda um relatório em um processo do pool e grava o resultado na tabela de cache."""
+    conexao = sqlite3.connect(caminho_banco, timeout=30)
+    try:
+        with conexao:
+            conexao.execute("UPDATE relatorio_analitico SET status = 'executando' WHERE id = ?", (job_id,))
+        try:
+            _, funcao = RELATORIOS[relatorio]
+            resultado = funcao(conexao, inicio, fim, fuso_horas)
+        except Exception as e:
+            with conexao:
+                conexao.execute("UPDATE relatorio_analitico SET status = 'erro', erro = ?, concluido_em = ? "
+                                "WHERE id = ?", (str(e)[:500], _agora(), job_id))
+            return
+        with conexao:
+            conexao.execute("UPDATE relatorio_analitico SET status = 'concluido', resultado = ?, concluido_em = ? "
+                            "WHERE id = ?", (json.dumps(resultado), _agora(), job_id))
+    finally:
+        conexao.close()
+
+
+def enviar_job(max_workers, caminho_banco, job_id, relatorio, inicio, fim, fuso_horas):
+    """Agenda o job no pool de processos sem esperar o resultado."""
+    global _pool
+    if _pool is None:
+        # 'spawn' evita herdar conexões e locks do worker do gunicorn
+        _pool = ProcessPoolExecutor(max_workers=max_workers,
+                                    mp_context=multiprocessing.get_context('spawn'))
+    _pool.submit(executar_job, caminho_banco, job_id, relatorio, inicio, fim, fuso_horas)
@@ -2,14 +2,38 @@
 
 import os
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask import Flask, render_template, request, redirect, url_for
+from flask import Flask, render_template, request, redirect, url_for, jsonify, send_from_directory, abort
 from flask_sqlalchemy import SQLAlchemy
 import datetime
-from flask import session, flash
+import json
+from flask import session, flash, g, has_app_context, Response, get_flashed_messages
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn
+from werkzeug.middleware.proxy_fix import ProxyFix
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from flask_sqlalchemy.session import Session as SessionBase
+from concurrent.futures import ThreadPoolExecutor
+import concurrent.futures
+import csv
+import io
+import analytics
+import promocoes
+import impressao
+import profiler
+import random
+import hashlib
+import re
+import math
+import time
+import socket
+import fcntl
+import threading
+from rate_limit import LimitadorTaxa
 
 # app.py (adicionar este bloco)
 
 from functools import wraps
+from contextlib import contextmanager
 
 # app.py (adicionar decorator de admin)
 def admin_required(f):
@@ -44,8 +68,113 @@ app.config.from_object(config[config_name])
 instance_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
 os.makedirs(instance_path, exist_ok=True)
 
-
-db = SQLAlchemy(app)
+def _versao_arquivos(*pastas):
+    """Hash curto do conteúdo dos arquivos estáticos e templates; muda a cada deploy que os altera."""
+    resumo = hashlib.sha1()
+    for pasta in pastas:
+        for raiz, _, nomes in sorted(os.walk(pasta)):
+            for nome in sorted(nomes):
+                caminho = os.path.join(raiz, nome)
+                resumo.update(os.path.relpath(caminho, pasta).encode())
+                with open(caminho, 'rb') as arquivo:
+                    resumo.update(arquivo.read())
+    return resumo.hexdigest()[:12]
+
+# Versão dos arquivos servidos (usada nas URLs dos estáticos e no cache do service worker)
+VERSAO_ARQUIVOS = _versao_arquivos(app.static_folder, os.path.join(app.root_path, app.template_folder))
+
+# --- MULTILOJA ---
+# Documentação: Cada loja tem seu próprio arquivo SQLite (um bind do
+# Flask-SQLAlchemy) com cardápio, pedidos e demais tabelas operacionais, então
+# o lock de escrita de uma loja movimentada nunca bloqueia outra. Os clientes
+# ficam no banco padrão e valem para todas as lojas. A loja "principal" usa o
+# próprio banco padrão, o que mantém instalações de uma loja só inalteradas.
+
+LOJA_PADRAO = 'principal'
+# Tabelas compartilhadas entre as lojas (ficam sempre no banco padrão)
+TABELAS_GLOBAIS = {'cliente', 'solicitacao_lgpd'}
+
+app.config['SQLALCHEMY_BINDS'] = {
+    f'loja_{slug}': app.config['LOJA_BANCO_URI'].format(slug)
+    for slug in app.config['LOJAS'] if slug != LOJA_PADRAO
+}
+
+class RoteadorLojas:
+    """Middleware WSGI que identifica a loja pelo subdomínio (centro.exemplo.com.br)
+    ou pelo prefixo /loja/<slug>/. O prefixo vai para o SCRIPT_NAME, então as rotas
+    continuam as mesmas e o url_for já gera links dentro da loja."""
+
+    def __init__(self, wsgi_app, lojas):
+        self.wsgi_app = wsgi_app
+        self.lojas = lojas
+
+    def __call__(self, environ, start_response):
+        loja = LOJA_PADRAO
+        subdominio = environ.get('HTTP_HOST', '').split(':')[0].split('.')[0]
+        if subdominio in self.lojas:
+            loja = subdominio
+        partes = environ.get('PATH_INFO', '').split('/', 3)
+        if len(partes) >= 3 and partes[1] == 'loja' and partes[2] in self.lojas:
+            loja = partes[2]
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + f'/loja/{loja}'
+            environ['PATH_INFO'] = '/' + (partes[3] if len(partes) > 3 else '')
+        environ['pastelaria.loja'] = loja
+        return self.wsgi_app(environ, start_response)
+
+app.wsgi_app = RoteadorLojas(app.wsgi_app, app.config['LOJAS'])
+
+def _somente_tabelas_globais(mapper, clause):
+    """True se a operação só envolve tabelas compartilhadas (ex.: cliente)."""
+    if mapper is not None:
+        return db.inspect(mapper).local_table.name in TABELAS_GLOBAIS
+    tabela = getattr(clause, 'table', None)
+    if tabela is not None:
+        return getattr(tabela, 'name', None) in TABELAS_GLOBAIS
+    if hasattr(clause, 'get_final_froms'):
+        nomes = {getattr(origem, 'name', None) for origem in clause.get_final_froms()}
+        return bool(nomes) and nomes <= TABELAS_GLOBAIS
+    return False
+
+class SessionLojas(SessionBase):
+    """Sessão que envia as consultas das tabelas de loja para o banco da loja atual (g.loja)."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            loja = g.get('loja', LOJA_PADRAO)
+            if loja != LOJA_PADRAO and not _somente_tabelas_globais(mapper, clause):
+                return self._db.engines[f'loja_{loja}']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+# Atrás do Nginx, o IP real do cliente vem no X-Forwarded-For
+if app.config['PROXIES_CONFIAVEIS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXIES_CONFIAVEIS'])
+
+# Limitador de tentativas compartilhado entre os workers (arquivo SQLite próprio)
+limitador = LimitadorTaxa(os.path.join(instance_path, app.config['RATE_LIMIT_ARQUIVO']))
+
+def limitar_tentativas(rota):
+    """Recusa o POST com 429 quando o IP ou o telefone excedem os limites de RATE_LIMITS[rota].
+
+    A verificação acontece antes de qualquer consulta ao banco ou cálculo de hash de senha.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            limites = app.config['RATE_LIMITS'].get(rota, {})
+            if request.method == 'POST' and limites:
+                chaves = [('ip', request.remote_addr), ('telefone', request.form.get('telefone'))]
+                for tipo, valor in chaves:
+                    if tipo in limites and valor:
+                        capacidade, janela = limites[tipo]
+                        if not limitador.permitir(f'{rota}:{tipo}:{valor}', capacidade, janela):
+                            return ("Muitas tentativas. Aguarde alguns minutos e tente novamente.",
+                                    429, {'Retry-After': str(janela // capacidade or 1)})
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+db = SQLAlchemy(app, session_options={'class_': SessionLojas})
 
 # --- MODELOS DO BANCO DE DADOS ---
 # Documentação: Cada classe representa uma tabela no banco de dados.
@@ -55,7 +184,9 @@ class Cliente(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
     telefone = db.Column(db.String(20), nullable=False, unique=True)
+    loja = db.Column(db.String(50), nullable=False, default=LOJA_PADRAO, server_default=LOJA_PADRAO) # Loja onde se cadastrou
     endereco = db.Column(db.String(200), nullable=False)
+    cep = db.Column(db.String(8), nullable=True) # só dígitos; define a zona de entrega
     senha_hash = db.Column(db.String(128), nullable=False) # NOVO CAMPO
     is_admin = db.Column(db.Boolean, default=False) # NOVO CAMPO
     consentimento_lgpd = db.Column(db.Boolean, nullable=False, default=False)
@@ -77,6 +208,13 @@ class Produto(db.Model):
     descricao = db.Column(db.String(200))
     preco = db.Column(db.Float, nullable=False)
     categoria = db.Column(db.String(50), nullable=False) # Ex: "Pastel Salgado", "Pastel Doce", "Bebida"
+    # Estoque disponível; None significa sem controle de estoque
+    estoque = db.Column(db.Integer, nullable=True)
+    # Se preenchido, o estoque volta a este valor no início de cada dia
+    estoque_diario = db.Column(db.Integer, nullable=True)
+    estoque_reposto_em = db.Column(db.Date, nullable=True)
+    # Trabalho de cozinha por unidade, em unidades de preparo (0 = item pronto, ex.: lata)
+    carga_preparo = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
 # Tabela de Pedidos
 class Pedido(db.Model):
@@ -84,19 +222,176 @@ class Pedido(db.Model):
     cliente_id = db.Column(db.Integer, db.ForeignKey('cliente.id'), nullable=False)
     data_pedido = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     valor_total = db.Column(db.Float, nullable=False)
+    desconto = db.Column(db.Float, nullable=False, default=0.0, server_default='0') # Soma dos descontos de promoções
     # O status indica se o pedido está "Pendente", "Em Preparo", "Pronto para Entrega", etc.
     status = db.Column(db.String(50), default="Pendente")
+    # Horário de retirada/entrega escolhido no checkout (hora local da loja)
+    horario = db.Column(db.DateTime, nullable=True)
+    # Unidades de preparo reservadas no horário (soma de carga_preparo dos itens)
+    carga_preparo = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Valor de fila_preparo.entrada logo depois de o pedido entrar na fila da cozinha:
+    # o trabalho à frente dele é posicao_fila - fila_preparo.saida
+    posicao_fila = db.Column(db.Integer, nullable=True)
+    # Entrega no endereço do cliente (False = retirada na loja) e a taxa cobrada, já somada ao valor_total
+    entrega = db.Column(db.Boolean, nullable=False, default=True, server_default='1')
+    taxa_entrega = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
 
 # Tabela associativa para os itens de um pedido (relação Muitos-para-Muitos)
 itens_pedido = db.Table('itens_pedido',
     db.Column('pedido_id', db.Integer, db.ForeignKey('pedido.id'), primary_key=True),
-    db.Column('produto_id', db.Integer, db.ForeignKey('produto.id'), primary_key=True)
+    db.Column('produto_id', db.Integer, db.ForeignKey('produto.id'), primary_key=True),
+    db.Column('quantidade', db.Integer, nullable=False, default=1, server_default='1')
 )
 
 # Adiciona a relação na tabela Pedido
 Pedido.produtos = db.relationship('Produto', secondary=itens_pedido, lazy='subquery',
         backref=db.backref('pedidos', lazy=True))
 
+# Status em que o pedido ainda precisa passar pela cozinha
+STATUS_ABERTOS = ('Recebido', 'Em Preparo')
+STATUS_PEDIDO = ('Recebido', 'Em Preparo', 'Pronto para Entrega', 'Entregue', 'Cancelado')
+
+# Tabela de Produção Pendente (quadro da cozinha)
+# Guarda, por produto, quantas unidades ainda precisam ser preparadas nos pedidos abertos.
+# É atualizada junto com o pedido (criação e troca de status), então o quadro
+# nunca precisa varrer os pedidos abertos para ser montado.
+class ProducaoPendente(db.Model):
+    __tablename__ = 'producao_pendente'
+    produto_id = db.Column(db.Integer, db.ForeignKey('produto.id'), primary_key=True)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    produto = db.relationship('Produto')
+
+
+# Fila da cozinha (uma única linha por loja, id = 1)
+# Contadores acumulados, em unidades de preparo, do que entrou e saiu da fila e o
+# ritmo recente da cozinha. São atualizados junto com os pedidos, então a previsão
+# de um pedido é calculada sem varrer os pedidos abertos.
+class FilaPreparo(db.Model):
+    __tablename__ = 'fila_preparo'
+    id = db.Column(db.Integer, primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0) # para o UPDATE condicional
+    entrada = db.Column(db.Integer, nullable=False, default=0)
+    saida = db.Column(db.Integer, nullable=False, default=0) # pronta ou cancelada
+    # Carga pronta e minutos com a fila ocupada, com peso que decai com o tempo
+    unidades_recentes = db.Column(db.Float, nullable=False, default=0.0)
+    minutos_recentes = db.Column(db.Float, nullable=False, default=0.0)
+    atualizado_em = db.Column(db.DateTime, nullable=True)
+
+# Tabela de Zonas de Entrega (por loja)
+# Faixa de CEPs atendida, com a taxa de entrega e o pedido mínimo. Um prefixo
+# (ex.: "01310") é gravado como a faixa 01310000 a 01310999.
+class ZonaEntrega(db.Model):
+    __tablename__ = 'zona_entrega'
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(100), nullable=False) # Ex.: "Centro", "Bela Vista"
+    cep_inicio = db.Column(db.String(8), nullable=False)
+    cep_fim = db.Column(db.String(8), nullable=False)
+    taxa = db.Column(db.Float, nullable=False, default=0.0)
+    pedido_minimo = db.Column(db.Float, nullable=False, default=0.0)
+
+# Tabela de Versões dos Dados
+# Contadores incrementados a cada alteração relevante (ex.: 'pedidos'), usados
+# como parte da chave de cache dos relatórios analíticos.
+class VersaoDados(db.Model):
+    __tablename__ = 'versao_dados'
+    nome = db.Column(db.String(50), primary_key=True)
+    valor = db.Column(db.Integer, nullable=False, default=0)
+
+# Tabela de Relatórios Analíticos (jobs em segundo plano e cache dos resultados)
+class RelatorioAnalitico(db.Model):
+    __tablename__ = 'relatorio_analitico'
+    __table_args__ = (db.UniqueConstraint('relatorio', 'inicio', 'fim', 'versao'),)
+    id = db.Column(db.Integer, primary_key=True)
+    relatorio = db.Column(db.String(50), nullable=False)
+    inicio = db.Column(db.String(10), nullable=False) # AAAA-MM-DD, inclusivo
+    fim = db.Column(db.String(10), nullable=False) # AAAA-MM-DD, inclusivo
+    versao = db.Column(db.Integer, nullable=False)
+    # "pendente", "executando", "concluido" ou "erro"
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    resultado = db.Column(db.Text) # JSON gravado pelo processo do pool
+    erro = db.Column(db.String(500))
+    criado_em = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    concluido_em = db.Column(db.DateTime)
+
+# Tabela de Notificações (outbox transacional)
+# Cada linha é gravada na mesma transação do pedido e enviada depois pelo
+# despachante (notificacoes.py), fora do caminho do checkout.
+class NotificacaoOutbox(db.Model):
+    __tablename__ = 'notificacao_outbox'
+    __table_args__ = (db.Index('ix_notificacao_outbox_fila', 'status', 'proxima_tentativa'),)
+    id = db.Column(db.Integer, primary_key=True)
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedido.id'), nullable=True, index=True)
+    evento = db.Column(db.String(50), nullable=False) # Ex: "pedido_criado"
+    canal = db.Column(db.String(30), nullable=False) # Ex: "webhook", "arquivo"
+    destino = db.Column(db.String(200), nullable=False)
+    payload = db.Column(db.Text, nullable=False) # JSON
+    # "pendente", "enviando", "enviado" ou "morto" (esgotou as tentativas)
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    proxima_tentativa = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    ultimo_erro = db.Column(db.String(500))
+    criado_em = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    enviado_em = db.Column(db.DateTime)
+
+# Tabela de Promoções (combos e descontos progressivos)
+class Promocao(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(100), nullable=False)
+    tipo = db.Column(db.String(20), nullable=False) # "combo" ou "leve_n" (ver promocoes.py)
+    regra = db.Column(db.Text, nullable=False) # JSON com os parâmetros do tipo
+    ativa = db.Column(db.Boolean, nullable=False, default=True)
+
+# Tabela de Capacidade por Faixa de Horário (configurada pelo admin)
+# Horários fora de qualquer faixa usam AGENDA_CAPACIDADE_PADRAO; capacidade 0 fecha a faixa.
+class CapacidadeHorario(db.Model):
+    __tablename__ = 'capacidade_horario'
+    id = db.Column(db.Integer, primary_key=True)
+    inicio = db.Column(db.String(5), nullable=False) # HH:MM, inclusivo
+    fim = db.Column(db.String(5), nullable=False) # HH:MM, exclusivo
+    capacidade = db.Column(db.Integer, nullable=False) # unidades de preparo por horário
+
+# Tabela de Ocupação dos Horários de Retirada/Entrega
+# Uma linha por horário (ex.: 12:00, 12:15...) com a capacidade e o quanto já foi
+# reservado. A reserva é feita na mesma transação do pedido, então nunca é
+# preciso somar os pedidos de um horário para saber se ainda cabe mais um.
+class OcupacaoHorario(db.Model):
+    __tablename__ = 'ocupacao_horario'
+    inicio = db.Column(db.DateTime, primary_key=True) # hora local da loja
+    capacidade = db.Column(db.Integer, nullable=False)
+    reservado = db.Column(db.Integer, nullable=False, default=0)
+
+# Tabela da Fila de Impressão (tickets da cozinha)
+# O ticket entra na fila na mesma transação do pedido; a impressão em si é feita
+# pelo impressao.py, fora do checkout. Reimpressões pelo admin geram uma nova linha.
+class TicketImpressao(db.Model):
+    __tablename__ = 'ticket_impressao'
+    __table_args__ = (db.Index('ix_ticket_impressao_fila', 'status', 'id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedido.id'), nullable=False)
+    dados = db.Column(db.Text, nullable=False) # JSON com o conteúdo do ticket (ver impressao.py)
+    reimpressao = db.Column(db.Boolean, nullable=False, default=False)
+    # "pendente", "imprimindo", "impresso" ou "erro" (esgotou as tentativas)
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    proxima_tentativa = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    ultimo_erro = db.Column(db.String(500))
+    criado_em = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    impresso_em = db.Column(db.DateTime)
+
+# Tabela de Solicitações de Exclusão de Dados (LGPD)
+# Fica no banco padrão, junto dos clientes. O progresso guarda, por loja, o
+# último pedido já tratado, então o job pode ser retomado de onde parou.
+class SolicitacaoLGPD(db.Model):
+    __tablename__ = 'solicitacao_lgpd'
+    id = db.Column(db.Integer, primary_key=True)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('cliente.id'), nullable=False)
+    # "pendente", "executando" ou "concluida"
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    progresso = db.Column(db.Text, nullable=False, default='{}') # JSON {loja: último pedido tratado}
+    pedidos_tratados = db.Column(db.Integer, nullable=False, default=0)
+    criado_em = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    atualizado_em = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    concluido_em = db.Column(db.DateTime)
 
 # --- APLICAÇÃO PRINCIPAL (CONTINUA NO PRÓXIMO PASSO) ---
 if __name__ == '__main__':
@@ -108,6 +403,73 @@ if __name__ == '__main__':
 # ... (código dos modelos do passo anterior) ...
 
 
+# --- FUNÇÕES DE LOJA ---
+
+def engine_loja(loja):
+    """Engine do banco de uma loja."""
+    return db.engines[None if loja == LOJA_PADRAO else f'loja_{loja}']
+
+@contextmanager
+def contexto_loja(loja):
+    """Abre um contexto de aplicação (com sessão própria) apontando para a loja.
+
+    Usado fora das requisições, ex.: despachante de notificações e inicialização.
+    """
+    with app.app_context():
+        g.loja = loja
+        yield
+
+def criar_tabelas():
+    """Cria as tabelas no banco padrão e as tabelas de loja em cada banco de loja.
+
+    Também adiciona às tabelas já existentes as colunas novas dos modelos.
+    """
+    db.create_all()
+    adicionar_colunas(engine_loja(LOJA_PADRAO), db.metadata.sorted_tables)
+    tabelas_loja = [t for t in db.metadata.sorted_tables if t.name not in TABELAS_GLOBAIS]
+    for slug in app.config['LOJAS']:
+        if slug != LOJA_PADRAO:
+            db.metadata.create_all(engine_loja(slug), tables=tabelas_loja)
+            adicionar_colunas(engine_loja(slug), tabelas_loja)
+
+def adicionar_colunas(engine, tabelas):
+    """ALTER TABLE ... ADD COLUMN para cada coluna dos modelos que falta no banco.
+
+    O create_all só cria tabelas que não existem; um banco criado por uma versão
+    anterior do app fica sem as colunas novas. Pode ser executado várias vezes.
+    Colunas NOT NULL sem server_default são adicionadas sem o NOT NULL (o SQLite
+    não aceita NOT NULL sem valor padrão em ADD COLUMN).
+    """
+    inspetor = db.inspect(engine)
+    existentes = set(inspetor.get_table_names())
+    with engine.begin() as conexao:
+        for tabela in tabelas:
+            if tabela.name not in existentes:
+                continue
+            colunas = {coluna['name'] for coluna in inspetor.get_columns(tabela.name)}
+            for coluna in tabela.columns:
+                if coluna.name in colunas or coluna.primary_key:
+                    continue
+                definicao = str(CreateColumn(coluna).compile(dialect=engine.dialect))
+                if coluna.server_default is None:
+                    definicao = definicao.replace(' NOT NULL', '')
+                conexao.execute(db.text(f'ALTER TABLE {tabela.name} ADD COLUMN {definicao}'))
+                print(f'Coluna {tabela.name}.{coluna.name} adicionada ao banco.')
+
+@app.before_request
+def definir_loja():
+    """Guarda a loja da requisição em g.loja; o carrinho vale só para a loja em que foi montado."""
+    g.loja = request.environ.get('pastelaria.loja', LOJA_PADRAO)
+    if session.get('loja', LOJA_PADRAO) != g.loja:
+        session.pop('carrinho', None)
+        session['loja'] = g.loja
+
+@app.context_processor
+def dados_loja():
+    return {'loja_atual': g.get('loja', LOJA_PADRAO), 'nome_loja': app.config['LOJAS'].get(g.get('loja', LOJA_PADRAO)),
+            'versao_arquivos': VERSAO_ARQUIVOS}
+
+
 # --- ROTAS DA APLICAÇÃO ---
 # Documentação: Cada função abaixo corresponde a uma página ou ação na aplicação.
 
@@ -120,23 +482,41 @@ def index():
 # Rota do Cardápio: Exibe todos os produtos
 @app.route('/cardapio')
 def cardapio():
-    """Busca todos os produtos no banco de dados e exibe na página do cardápio."""
-    pasteis_salgados = Produto.query.filter_by(categoria='Pastel Salgado').all()
-    pasteis_doces = Produto.query.filter_by(categoria='Pastel Doce').all()
-    bebidas = Produto.query.filter_by(categoria='Bebida').all()
-    return render_template('cardapio.html', 
-                           pasteis_salgados=pasteis_salgados,
-                           pasteis_doces=pasteis_doces,
-                           bebidas=bebidas)
+    """Busca os produtos disponíveis (uma única consulta) e exibe na página do cardápio.
+
+    A página não depende do usuário (ver sessao_json), então a versão do cardápio
+    serve de ETag: uma revalidação sem mudanças responde 304 sem consultar produtos.
+    """
+    repor_estoque_diario()
+    etag = f'{g.loja}-{VERSAO_ARQUIVOS}-{versao_atual("cardapio")}'
+    if request.if_none_match.contains(etag):
+        resposta = Response(status=304)
+    else:
+        # Produtos esgotados ficam de fora do cardápio
+        produtos = Produto.query.filter(db.or_(Produto.estoque.is_(None), Produto.estoque > 0)) \
+            .order_by(Produto.id).all()
+        por_categoria = {}
+        for produto in produtos:
+            por_categoria.setdefault(produto.categoria, []).append(produto)
+        resposta = app.make_response(render_template('cardapio.html', pagina_compartilhada=True,
+                               pasteis_salgados=por_categoria.get('Pastel Salgado', []),
+                               pasteis_doces=por_categoria.get('Pastel Doce', []),
+                               bebidas=por_categoria.get('Bebida', [])))
+    resposta.set_etag(etag)
+    # Sempre revalida (o service worker mostra a cópia guardada enquanto isso)
+    resposta.headers['Cache-Control'] = 'no-cache'
+    return resposta
 
 # A chave secreta é definida na configuração
 
 @app.route('/cadastro', methods=['GET', 'POST'])
+@limitar_tentativas('cadastro')
 def cadastro():
     if request.method == 'POST':
         nome = request.form['nome']
         telefone = request.form['telefone']
         endereco = request.form['endereco']
+        cep = normalizar_cep(request.form.get('cep'))
         senha = request.form['senha']
         consentimento = 'consentimento' in request.form
 
@@ -144,6 +524,10 @@ def cadastro():
             flash("É necessário aceitar os termos da LGPD.", "error")
             return redirect(url_for('cadastro'))
 
+        if cep is None:
+            flash("Informe um CEP válido (8 dígitos).", "error")
+            return redirect(url_for('cadastro'))
+
         # Verifica se o cliente já existe
         if Cliente.query.filter_by(telefone=telefone).first():
             flash("Este telefone já está cadastrado.", "warning")
@@ -153,6 +537,8 @@ def cadastro():
             nome=nome,
             telefone=telefone,
             endereco=endereco,
+            cep=cep,
+            loja=g.loja,
             consentimento_lgpd=True
         )
         novo_cliente.set_senha(senha) # Usa o método para criptografar a senha
@@ -171,6 +557,7 @@ def cadastro():
 # app.py (novas rotas)
 
 @app.route('/login', methods=['GET', 'POST'])
+@limitar_tentativas('login')
 def login():
     if request.method == 'POST':
         telefone = request.form['telefone']
@@ -221,7 +608,140 @@ def admin_dashboard():
 def admin_pedidos():
     """Lista todos os pedidos recebidos."""
     pedidos = Pedido.query.order_by(Pedido.data_pedido.desc()).all()
-    return render_template('admin/pedidos.html', pedidos=pedidos)
+    return render_template('admin/pedidos.html', pedidos=pedidos, status_pedido=STATUS_PEDIDO)
+
+@app.route('/admin/pedido/<int:pedido_id>/status', methods=['POST'])
+@login_required
+@admin_required
+def alterar_status_pedido(pedido_id):
+    """Altera o status de um pedido e atualiza o quadro de preparo da cozinha."""
+    pedido = Pedido.query.get_or_404(pedido_id)
+    novo_status = request.form['status']
+    if novo_status not in STATUS_PEDIDO:
+        flash('Status inválido.', 'error')
+        return redirect(url_for('admin_pedidos'))
+
+    status_anterior = pedido.status
+    # UPDATE condicional: se outro admin mudou o status ao mesmo tempo,
+    # nenhuma linha é alterada e o quadro não é ajustado duas vezes.
+    alterado = Pedido.query.filter_by(id=pedido.id, status=status_anterior).update(
+        {Pedido.status: novo_status}, synchronize_session=False)
+    if alterado:
+        estava_aberto = status_anterior in STATUS_ABERTOS
+        fica_aberto = novo_status in STATUS_ABERTOS
+        if estava_aberto != fica_aberto:
+            ajustar_producao(itens_do_pedido(pedido.id), 1 if fica_aberto else -1)
+            if fica_aberto:
+                # Pedido reaberto volta para o fim da fila
+                pedido.posicao_fila = movimentar_fila(entrada=pedido.carga_preparo)
+            else:
+                movimentar_fila(saida=pedido.carga_preparo,
+                                pronta=0 if novo_status == 'Cancelado' else pedido.carga_preparo)
+        # Pedido cancelado devolve o estoque e a capacidade do horário (e os retoma se for reaberto)
+        if novo_status == 'Cancelado' and status_anterior != 'Cancelado':
+            devolver_estoque(itens_do_pedido(pedido.id))
+            if pedido.horario is not None:
+                liberar_horario(pedido.horario, pedido.carga_preparo)
+        elif status_anterior == 'Cancelado' and novo_status != 'Cancelado':
+            # As unidades e a capacidade devolvidas podem ter sido vendidas depois do
+            # cancelamento: retoma com as mesmas operações condicionais do checkout
+            # (produtos removidos ficam de fora)
+            itens = itens_do_pedido(pedido.id)
+            existentes = {produto_id for (produto_id,) in db.session.query(Produto.id)
+                          .filter(Produto.id.in_([produto_id for produto_id, _ in itens]))}
+            if not baixar_estoque([item for item in itens if item[0] in existentes]):
+                db.session.rollback()
+                flash(f'Não há estoque para reabrir o pedido #{pedido.id}.', 'error')
+                return redirect(url_for('admin_pedidos'))
+            if pedido.horario is not None and not reservar_horario(pedido.horario, pedido.carga_preparo):
+                db.session.rollback()
+                flash(f'O horário do pedido #{pedido.id} está lotado; não é possível reabri-lo.', 'error')
+                return redirect(url_for('admin_pedidos'))
+        incrementar_versao('pedidos')
+        db.session.commit()
+        flash(f'Pedido #{pedido.id} agora está "{novo_status}".', 'success')
+    else:
+        db.session.rollback()
+        flash('O pedido foi alterado por outra pessoa. Confira o status atual.', 'warning')
+    return redirect(url_for('admin_pedidos'))
+
+# --- QUADRO DE PREPARO DA COZINHA ---
+# Documentação: A tabela producao_pendente é mantida de forma incremental pelas
+# funções abaixo, sempre dentro da mesma transação que cria ou altera o pedido.
+
+def registrar_itens_pedido(pedido_id, itens):
+    """Grava os itens (produto_id, quantidade) de um pedido na tabela associativa."""
+    if itens:
+        db.session.execute(itens_pedido.insert(), [
+            {'pedido_id': pedido_id, 'produto_id': produto_id, 'quantidade': quantidade}
+            for produto_id, quantidade in itens
+        ])
+
+def itens_do_pedido(pedido_id):
+    """Retorna a lista de (produto_id, quantidade) de um pedido."""
+    linhas = db.session.execute(
+        db.select(itens_pedido.c.produto_id, itens_pedido.c.quantidade)
+        .where(itens_pedido.c.pedido_id == pedido_id))
+    return [(produto_id, quantidade) for produto_id, quantidade in linhas]
+
+def ajustar_producao(itens, sinal):
+    """Soma (sinal=1) ou subtrai (sinal=-1) as quantidades dos itens na produção pendente."""
+    for produto_id, quantidade in itens:
+        atualizado = ProducaoPendente.query.filter_by(produto_id=produto_id).update(
+            {ProducaoPendente.quantidade: ProducaoPendente.quantidade + sinal * quantidade},
+            synchronize_session=False)
+        if not atualizado and sinal > 0:
+            db.session.add(ProducaoPendente(produto_id=produto_id, quantidade=quantidade))
+
+def recalcular_producao():
+    """Reconstrói a produção pendente a partir dos pedidos abertos (usado só na inicialização)."""
+    ProducaoPendente.query.delete()
+    totais = db.session.execute(
+        db.select(itens_pedido.c.produto_id, db.func.sum(itens_pedido.c.quantidade))
+        .join(Pedido, Pedido.id == itens_pedido.c.pedido_id)
+        .where(Pedido.status.in_(STATUS_ABERTOS))
+        .group_by(itens_pedido.c.produto_id))
+    for produto_id, quantidade in totais:
+        db.session.add(ProducaoPendente(produto_id=produto_id, quantidade=quantidade))
+    db.session.commit()
+
+def quadro_preparo():
+    """Retorna {categoria: [{produto_id, nome, quantidade}, ...]} com o que falta preparar."""
+    linhas = db.session.query(Produto.categoria, Produto.id, Produto.nome, ProducaoPendente.quantidade) \
+        .join(ProducaoPendente, ProducaoPendente.produto_id == Produto.id) \
+        .filter(ProducaoPendente.quantidade > 0) \
+        .order_by(Produto.categoria, Produto.nome).all()
+    quadro = {}
+    for categoria, produto_id, nome, quantidade in linhas:
+        quadro.setdefault(categoria, []).append(
+            {'produto_id': produto_id, 'nome': nome, 'quantidade': quantidade})
+    return quadro
+
+def recalcular_fila():
+    """Reconstrói as posições na fila dos pedidos abertos, por ordem de chegada (só na inicialização)."""
+    fila = db.session.get(FilaPreparo, 1) or FilaPreparo(id=1, versao=0, unidades_recentes=0.0, minutos_recentes=0.0)
+    posicao = 0
+    for pedido in Pedido.query.filter(Pedido.status.in_(STATUS_ABERTOS)).order_by(Pedido.id):
+        posicao += pedido.carga_preparo
+        pedido.posicao_fila = posicao
+    fila.entrada, fila.saida = posicao, 0
+    fila.versao += 1
+    db.session.add(fila)
+    db.session.commit()
+
+@app.route('/admin/preparo')
+@login_required
+@admin_required
+def admin_preparo():
+    """Quadro da cozinha: quantidade a preparar por produto, agrupada por categoria."""
+    return render_template('admin/preparo.html', quadro=quadro_preparo())
+
+@app.route('/admin/preparo.json')
+@login_required
+@admin_required
+def admin_preparo_json():
+    """Mesmo quadro da cozinha em JSON, para telas que fazem polling."""
+    return jsonify(quadro_preparo())
 
 @app.route('/admin/produtos')
 @login_required
@@ -241,9 +761,15 @@ def novo_produto():
         descricao = request.form['descricao']
         preco = float(request.form['preco'])
         categoria = request.form['categoria']
+        estoque, estoque_diario = ler_estoque_formulario()
+        carga_preparo = int(request.form.get('carga_preparo') or 1)
 
-        novo_prod = Produto(nome=nome, descricao=descricao, preco=preco, categoria=categoria)
+        novo_prod = Produto(nome=nome, descricao=descricao, preco=preco, categoria=categoria,
+                            estoque=estoque, estoque_diario=estoque_diario, carga_preparo=carga_preparo,
+                            estoque_reposto_em=agora_loja().date() if estoque_diario is not None else None)
         db.session.add(novo_prod)
+        incrementar_versao('promocoes')
+        incrementar_versao('cardapio')
         db.session.commit()
         flash('Produto adicionado com sucesso!', 'success')
         return redirect(url_for('admin_produtos'))
@@ -261,6 +787,10 @@ def editar_produto(produto_id):
         produto.descricao = request.form['descricao']
         produto.preco = float(request.form['preco'])
         produto.categoria = request.form['categoria']
+        produto.estoque, produto.estoque_diario = ler_estoque_formulario()
+        produto.carga_preparo = int(request.form.get('carga_preparo') or 1)
+        incrementar_versao('promocoes')
+        incrementar_versao('cardapio')
         db.session.commit()
         flash('Produto atualizado com sucesso!', 'success')
         return redirect(url_for('admin_produtos'))
@@ -273,16 +803,27 @@ def editar_produto(produto_id):
 def deletar_produto(produto_id):
     """Ação para deletar um produto."""
     produto = Produto.query.get_or_404(produto_id)
+    ProducaoPendente.query.filter_by(produto_id=produto.id).delete()
     db.session.delete(produto)
+    incrementar_versao('promocoes')
+    incrementar_versao('cardapio')
     db.session.commit()
     flash('Produto deletado com sucesso!', 'success')
     return redirect(url_for('admin_produtos'))
 
 # --- FUNÇÃO PARA INICIALIZAR O BANCO DE DADOS ---
 def inicializar_banco():
-    """Cria o banco de dados e adiciona alguns produtos de exemplo."""
+    """Cria o banco de dados e adiciona alguns produtos de exemplo em cada loja."""
     with app.app_context():
-        db.create_all()
+        criar_tabelas()
+    for loja in app.config['LOJAS']:
+        inicializar_loja(loja)
+
+def inicializar_loja(loja):
+    """Recalcula o quadro de preparo e cria o cardápio de exemplo de uma loja vazia."""
+    with contexto_loja(loja):
+        recalcular_producao()
+        recalcular_fila()
         
         # Adiciona produtos apenas se o banco estiver vazio
         if not Produto.query.first():
@@ -296,7 +837,7 @@ def inicializar_banco():
             db.session.add(Produto(nome='Pastel de Banana com Canela', descricao='Banana com açúcar e canela', preco=7.00, categoria='Pastel Doce'))
 
             # Bebidas
-            db.session.add(Produto(nome='Refrigerante Lata', descricao='Coca-Cola, Guaraná, etc.', preco=5.00, categoria='Bebida'))
+            db.session.add(Produto(nome='Refrigerante Lata', descricao='Coca-Cola, Guaraná, etc.', preco=5.00, categoria='Bebida', carga_preparo=0))
             db.session.add(Produto(nome='Suco Natural de Laranja', descricao='300ml', preco=6.00, categoria='Bebida'))
             
             db.session.commit()
@@ -317,6 +858,10 @@ def adicionar_carrinho(produto_id):
 
     # Busca o produto no banco para pegar os detalhes
     produto = Produto.query.get_or_404(produto_id)
+    quantidade_atual = carrinho[id_str]['quantidade'] if id_str in carrinho else 0
+    if produto.estoque is not None and produto.estoque <= quantidade_atual:
+        flash(f'Desculpe, "{produto.nome}" esgotou.', 'warning')
+        return redirect(url_for('cardapio'))
 
     # Se o item já está no carrinho, incrementa a quantidade
     if id_str in carrinho:
@@ -338,12 +883,15 @@ def adicionar_carrinho(produto_id):
 def ver_carrinho():
     """Exibe o conteúdo do carrinho de compras."""
     carrinho = session.get('carrinho', {})
-    total_pedido = 0
-    # Calcula o valor total do pedido
-    for item in carrinho.values():
-        total_pedido += item['preco'] * item['quantidade']
+    # Calcula o valor total do pedido (com as promoções aplicadas)
+    totais = calcular_totais(carrinho)
+    # Horários de retirada/entrega em que a cozinha ainda comporta este carrinho
+    horarios = horarios_disponiveis(itens_e_carga(carrinho)[1]) if carrinho else []
+    # Se o CEP do cliente é atendido e com qual taxa
+    cotacao = cotar_entrega(db.session.get(Cliente, session['cliente_id']).cep, totais['total'])
 
-    return render_template('carrinho.html', carrinho=carrinho, total_pedido=total_pedido)
+    return render_template('carrinho.html', carrinho=carrinho, totais=totais, total_pedido=totais['total'],
+                           horarios=horarios, entrega=cotacao)
 
 @app.route('/remover_item/<int:produto_id>', methods=['POST'])
 @login_required
@@ -368,21 +916,54 @@ def finalizar_pedido():
         flash('Seu carrinho está vazio.', 'warning')
         return redirect(url_for('cardapio'))
 
+    horario = ler_horario(request.form.get('horario'))
+    if horario is None:
+        flash('Escolha um dos horários disponíveis para retirada/entrega.', 'warning')
+        return redirect(url_for('ver_carrinho'))
+
     cliente_id = session['cliente_id']
-    valor_total = sum(item['preco'] * item['quantidade'] for item in carrinho.values())
+    # Mesmo cálculo da página do carrinho, para que o total nunca divirja
+    totais = calcular_totais(carrinho)
+
+    entrega = request.form.get('modo', 'entrega') != 'retirada'
+    taxa_entrega = 0.0
+    if entrega:
+        cotacao = cotar_entrega(db.session.get(Cliente, cliente_id).cep, totais['total'])
+        if not cotacao['atende']:
+            flash(cotacao['motivo'], 'warning')
+            return redirect(url_for('ver_carrinho'))
+        taxa_entrega = cotacao['taxa']
+
+    # Monta os itens do pedido (produto, quantidade) e a carga de preparo com uma única consulta
+    ids_carrinho = [int(produto_id_str) for produto_id_str in carrinho]
+    itens, carga = itens_e_carga(carrinho)
 
     # Cria o novo pedido
-    novo_pedido = Pedido(cliente_id=cliente_id, valor_total=valor_total, status="Recebido")
-
-    # Adiciona os produtos do carrinho ao pedido
-    for produto_id_str in carrinho:
-        produto_id = int(produto_id_str)
-        produto = Produto.query.get(produto_id)
-        if produto:
-            novo_pedido.produtos.append(produto)
+    novo_pedido = Pedido(cliente_id=cliente_id, valor_total=round(totais['total'] + taxa_entrega, 2),
+                         desconto=totais['desconto'], status="Recebido", horario=horario, carga_preparo=carga,
+                         entrega=entrega, taxa_entrega=taxa_entrega)
 
+    garantir_horarios()
     try:
+        repor_estoque_diario()
+        if not baixar_estoque(itens):
+            db.session.rollback()
+            esgotados = [p.nome for p in Produto.query.filter(Produto.id.in_(ids_carrinho))
+                         if p.estoque is not None and p.estoque < carrinho[str(p.id)]['quantidade']]
+            flash(f'Não há estoque suficiente de: {", ".join(esgotados)}. Ajuste seu carrinho.', 'warning')
+            return redirect(url_for('ver_carrinho'))
+        if not reservar_horario(horario, carga):
+            db.session.rollback()
+            flash('O horário escolhido acabou de lotar. Escolha outro horário.', 'warning')
+            return redirect(url_for('ver_carrinho'))
         db.session.add(novo_pedido)
+        db.session.flush() # Gera o id do pedido antes de gravar os itens
+        registrar_itens_pedido(novo_pedido.id, itens)
+        ajustar_producao(itens, 1)
+        novo_pedido.posicao_fila = movimentar_fila(entrada=carga)
+        incrementar_versao('pedidos')
+        enfileirar_notificacoes_pedido(novo_pedido, carrinho, itens)
+        enfileirar_ticket(novo_pedido)
         db.session.commit()
 
         # Limpa o carrinho da sessão
@@ -391,6 +972,7 @@ def finalizar_pedido():
         flash('Pedido finalizado com sucesso! Em breve você receberá seu delicioso pastel.', 'success')
         return redirect(url_for('pedido_confirmado', pedido_id=novo_pedido.id))
     except:
+        db.session.rollback()
         flash('Ocorreu um erro ao finalizar seu pedido.', 'error')
         return redirect(url_for('ver_carrinho'))
 
@@ -405,6 +987,1270 @@ def pedido_confirmado(pedido_id):
     return render_template('pedido_confirmado.html', pedido=pedido)
 
 
+# --- ESTOQUE ---
+# Documentação: A baixa de estoque do checkout é um único UPDATE condicional
+# para todos os itens do carrinho; se algum item não tiver saldo, nenhuma linha
+# é alterada pela metade e o pedido inteiro é desfeito. Não há leitura prévia
+# do saldo, então dois checkouts simultâneos nunca vendem a mesma unidade.
+
+_ultima_reposicao = {} # loja -> data da última reposição feita por este processo
+
+def repor_estoque_diario():
+    """Volta o estoque dos produtos com estoque_diario ao valor configurado, uma vez por dia."""
+    hoje = agora_loja().date() # dia da loja, não o do servidor (UTC)
+    if _ultima_reposicao.get(g.loja) == hoje:
+        return
+    repostos = Produto.query.filter(
+        Produto.estoque_diario.isnot(None),
+        db.or_(Produto.estoque_reposto_em.is_(None), Produto.estoque_reposto_em < hoje),
+    ).update({Produto.estoque: Produto.estoque_diario, Produto.estoque_reposto_em: hoje},
+             synchronize_session=False)
+    if repostos:
+        incrementar_versao('cardapio') # produtos esgotados voltam ao cardápio
+    db.session.commit()
+    _ultima_reposicao[g.loja] = hoje
+
+def baixar_estoque(itens):
+    """Desconta as quantidades de todos os itens (produto_id, quantidade) de uma vez.
+
+    Retorna False se algum item não tiver estoque suficiente; nesse caso os
+    demais itens já foram descontados e a transação precisa ser desfeita.
+    """
+    if not itens:
+        return True
+    quantidade = db.case(dict(itens), value=Produto.id)
+    alterados = Produto.query.filter(
+        Produto.id.in_([produto_id for produto_id, _ in itens]),
+        db.or_(Produto.estoque.is_(None), Produto.estoque >= quantidade),
+    ).update({Produto.estoque: Produto.estoque - quantidade}, synchronize_session=False)
+    if alterados != len(itens):
+        return False
+    # Um produto que esgotou sai do cardápio, então a versão do cardápio muda
+    if Produto.query.filter(Produto.id.in_([produto_id for produto_id, _ in itens]), Produto.estoque == 0).count():
+        incrementar_versao('cardapio')
+    return True
+
+def devolver_estoque(itens):
+    """Devolve ao estoque as quantidades dos itens, ex.: pedido cancelado.
+    Produtos sem controle de estoque não mudam."""
+    if not itens:
+        return
+    ids = [produto_id for produto_id, _ in itens]
+    quantidade = db.case(dict(itens), value=Produto.id)
+    Produto.query.filter(Produto.id.in_(ids), Produto.estoque.isnot(None)).update(
+        {Produto.estoque: Produto.estoque + quantidade}, synchronize_session=False)
+    # Um produto que voltou a ter saldo volta ao cardápio
+    if Produto.query.filter(Produto.id.in_(ids), Produto.estoque > 0, Produto.estoque <= quantidade).count():
+        incrementar_versao('cardapio')
+
+def ler_estoque_formulario():
+    """Lê os campos opcionais de estoque do formulário de produto (vazio = sem controle)."""
+    estoque = request.form.get('estoque', '').strip()
+    estoque_diario = request.form.get('estoque_diario', '').strip()
+    return (int(estoque) if estoque else None, int(estoque_diario) if estoque_diario else None)
+
+
+# --- PROMOÇÕES ---
+# Documentação: O motor de promoções (promocoes.py) é compilado uma vez por
+# processo e só é recompilado quando o contador de versão 'promocoes' muda,
+# ou seja, quando uma promoção ou um produto é criado, alterado ou removido.
+
+_motor_promocoes = {} # loja -> (versão, motor compilado)
+
+def motor_promocoes():
+    """Retorna o motor de promoções da loja atual, compilado para a versão atual das regras."""
+    versao = versao_atual('promocoes')
+    compilado = _motor_promocoes.get(g.loja)
+    if compilado is None or compilado[0] != versao:
+        regras = [(p.id, p.nome, p.tipo, json.loads(p.regra))
+                  for p in Promocao.query.filter_by(ativa=True).order_by(Promocao.id)]
+        catalogo = dict(db.session.query(Produto.id, Produto.categoria).all())
+        compilado = _motor_promocoes[g.loja] = (versao, promocoes.MotorPromocoes(regras, catalogo))
+    return compilado[1]
+
+def calcular_totais(carrinho):
+    """Subtotal, descontos e total do carrinho; usado pelo carrinho e pelo checkout."""
+    itens = [(int(produto_id), item['preco'], item['quantidade']) for produto_id, item in carrinho.items()]
+    return motor_promocoes().avaliar(itens)
+
+@app.route('/admin/promocoes')
+@login_required
+@admin_required
+def admin_promocoes():
+    """Lista as promoções cadastradas."""
+    lista = Promocao.query.order_by(Promocao.id).all()
+    return render_template('admin/promocoes.html', promocoes=lista, tipos=promocoes.TIPOS)
+
+@app.route('/admin/promocao/nova', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def nova_promocao():
+    """Página para cadastrar uma promoção."""
+    if request.method == 'POST':
+        nome = request.form['nome']
+        tipo = request.form['tipo']
+        try:
+            regra = json.loads(request.form['regra'])
+            if not isinstance(regra, dict):
+                raise ValueError('A regra deve ser um objeto JSON.')
+            promocoes.validar_regra(tipo, regra)
+        except ValueError as e:
+            flash(f'Regra inválida: {e}', 'error')
+            return render_template('admin/form_promocao.html', tipos=promocoes.TIPOS, form=request.form)
+
+        db.session.add(Promocao(nome=nome, tipo=tipo, regra=json.dumps(regra)))
+        incrementar_versao('promocoes')
+        db.session.commit()
+        flash('Promoção cadastrada com sucesso!', 'success')
+        return redirect(url_for('admin_promocoes'))
+
+    return render_template('admin/form_promocao.html', tipos=promocoes.TIPOS, form={})
+
+@app.route('/admin/promocao/alternar/<int:promocao_id>', methods=['POST'])
+@login_required
+@admin_required
+def alternar_promocao(promocao_id):
+    """Ativa ou desativa uma promoção."""
+    promocao = Promocao.query.get_or_404(promocao_id)
+    promocao.ativa = not promocao.ativa
+    incrementar_versao('promocoes')
+    db.session.commit()
+    flash(f'Promoção "{promocao.nome}" {"ativada" if promocao.ativa else "desativada"}.', 'success')
+    return redirect(url_for('admin_promocoes'))
+
+@app.route('/admin/promocao/deletar/<int:promocao_id>', methods=['POST'])
+@login_required
+@admin_required
+def deletar_promocao(promocao_id):
+    """Remove uma promoção."""
+    promocao = Promocao.query.get_or_404(promocao_id)
+    db.session.delete(promocao)
+    incrementar_versao('promocoes')
+    db.session.commit()
+    flash('Promoção removida com sucesso!', 'success')
+    return redirect(url_for('admin_promocoes'))
+
+
+# --- NOTIFICAÇÕES (OUTBOX) ---
+# Documentação: O checkout só grava as notificações na tabela notificacao_outbox;
+# o envio (SMS/WhatsApp/webhook) fica a cargo do despachante em notificacoes.py.
+
+def enfileirar_notificacoes_pedido(pedido, carrinho, itens):
+    """Grava, na transação atual, as notificações de novo pedido para o cliente e para a loja."""
+    cliente = db.session.get(Cliente, pedido.cliente_id)
+    payload = json.dumps({
+        'loja': g.loja,
+        'pedido_id': pedido.id,
+        'cliente': cliente.nome,
+        'telefone': cliente.telefone,
+        'endereco': cliente.endereco,
+        'valor_total': round(pedido.valor_total, 2),
+        'horario': pedido.horario.strftime('%d/%m/%Y %H:%M') if pedido.horario else None,
+        'itens': [{'nome': carrinho[str(produto_id)]['nome'], 'quantidade': quantidade}
+                  for produto_id, quantidade in itens],
+    })
+    destinos = [(app.config['NOTIFICACAO_CANAL_CLIENTE'], cliente.telefone),
+                (app.config['NOTIFICACAO_CANAL_LOJA'], app.config['NOTIFICACAO_DESTINO_LOJA'])]
+    for canal, destino in destinos:
+        if canal and destino:
+            db.session.add(NotificacaoOutbox(pedido_id=pedido.id, evento='pedido_criado', canal=canal,
+                                             destino=destino, payload=payload))
+
+
+# --- RELATÓRIOS ANALÍTICOS ---
+# Documentação: As agregações pesadas rodam no pool de processos do módulo
+# analytics. O worker web só consulta o cache e agenda jobs, nunca agrega.
+
+# Jobs "pendente"/"executando" mais antigos que isso são considerados perdidos
+# (ex.: o worker do gunicorn que os agendou foi reiniciado) e são reenviados.
+PRAZO_JOB_ANALITICO = datetime.timedelta(minutes=15)
+
+def incrementar_versao(nome):
+    """Incrementa o contador de versão `nome` na transação atual."""
+    atualizado = VersaoDados.query.filter_by(nome=nome).update(
+        {VersaoDados.valor: VersaoDados.valor + 1}, synchronize_session=False)
+    if not atualizado:
+        db.session.add(VersaoDados(nome=nome, valor=1))
+
+def versao_atual(nome):
+    """Retorna o valor atual do contador de versão `nome`."""
+    registro = db.session.get(VersaoDados, nome)
+    return registro.valor if registro else 0
+
+def solicitar_relatorio(relatorio, inicio, fim):
+    """Retorna o job em cache para (relatório, período, versão) ou agenda um novo."""
+    versao = versao_atual('pedidos')
+    chave = dict(relatorio=relatorio, inicio=inicio.isoformat(), fim=fim.isoformat(), versao=versao)
+    job = RelatorioAnalitico.query.filter_by(**chave).first()
+    if job is None:
+        job = RelatorioAnalitico(**chave)
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Outro admin pediu o mesmo relatório ao mesmo tempo
+            db.session.rollback()
+            return RelatorioAnalitico.query.filter_by(**chave).one()
+    elif job.status == 'erro' or (job.status in ('pendente', 'executando')
+                                  and job.criado_em < datetime.datetime.utcnow() - PRAZO_JOB_ANALITICO):
+        job.status = 'pendente'
+        job.erro = None
+        job.criado_em = datetime.datetime.utcnow()
+        db.session.commit()
+    else:
+        return job
+
+    analytics.enviar_job(app.config['ANALYTICS_WORKERS'], engine_loja(g.loja).url.database, job.id, relatorio,
+                         chave['inicio'], (fim + datetime.timedelta(days=1)).isoformat(),
+                         app.config['ANALYTICS_FUSO_HORARIO'])
+    return job
+
+@app.route('/admin/relatorios', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def admin_relatorios():
+    """Formulário para solicitar relatórios e lista dos jobs recentes."""
+    if request.method == 'POST':
+        relatorio = request.form['relatorio']
+        try:
+            inicio = datetime.date.fromisoformat(request.form['inicio'])
+            fim = datetime.date.fromisoformat(request.form['fim'])
+        except ValueError:
+            flash('Período inválido.', 'error')
+            return redirect(url_for('admin_relatorios'))
+        if relatorio not in analytics.RELATORIOS or inicio > fim:
+            flash('Relatório ou período inválido.', 'error')
+            return redirect(url_for('admin_relatorios'))
+        job = solicitar_relatorio(relatorio, inicio, fim)
+        return redirect(url_for('admin_relatorio', job_id=job.id))
+
+    hoje = datetime.date.today()
+    jobs = RelatorioAnalitico.query.order_by(RelatorioAnalitico.criado_em.desc()).limit(20).all()
+    return render_template('admin/relatorios.html', jobs=jobs, relatorios=analytics.RELATORIOS,
+                           inicio_padrao=(hoje - datetime.timedelta(days=30)).isoformat(),
+                           fim_padrao=hoje.isoformat())
+
+@app.route('/admin/relatorios/<int:job_id>')
+@login_required
+@admin_required
+def admin_relatorio(job_id):
+    """Mostra o status do job e, quando concluído, o resultado em cache."""
+    job = RelatorioAnalitico.query.get_or_404(job_id)
+    resultado = json.loads(job.resultado) if job.status == 'concluido' else None
+    titulo = analytics.RELATORIOS.get(job.relatorio, (job.relatorio,))[0]
+    return render_template('admin/relatorio.html', job=job, titulo=titulo, resultado=resultado)
+
+
+# --- VISÃO DE TODAS AS LOJAS ---
+# Documentação: As consultas abaixo rodam em paralelo, uma thread por loja,
+# direto nas engines de cada banco (sem passar pela sessão da requisição).
+
+def _inicio_do_dia_utc(dia):
+    """Meia-noite do dia no fuso da loja, em UTC (como data_pedido é gravada)."""
+    return datetime.datetime.combine(dia, datetime.time()) - \
+        datetime.timedelta(hours=app.config['ANALYTICS_FUSO_HORARIO'])
+
+def _resumo_loja(loja, engine):
+    """Resumo do dia de uma loja: pedidos, faturamento e pedidos abertos."""
+    hoje = _inicio_do_dia_utc(agora_loja().date()).strftime('%Y-%m-%d %H:%M:%S')
+    with engine.connect() as conexao:
+        pedidos, faturamento, abertos = conexao.execute(db.text(
+            "SELECT COUNT(*), COALESCE(SUM(CASE WHEN status != 'Cancelado' THEN valor_total END), 0), "
+            "COALESCE(SUM(CASE WHEN status IN ('Recebido', 'Em Preparo') THEN 1 END), 0) "
+            "FROM pedido WHERE data_pedido >= :hoje"), {'hoje': hoje}).one()
+    return {'loja': loja, 'nome': app.config['LOJAS'][loja], 'pedidos': pedidos,
+            'faturamento': faturamento, 'abertos': abertos}
+
+def _pedidos_loja(loja, engine, inicio, fim):
+    """Pedidos de uma loja no período [inicio, fim], para exportação."""
+    with engine.connect() as conexao:
+        return conexao.execute(db.text(
+            "SELECT id, cliente_id, data_pedido, valor_total, desconto, status FROM pedido "
+            "WHERE data_pedido >= :inicio AND data_pedido < :fim ORDER BY id"),
+            {'inicio': _inicio_do_dia_utc(inicio).strftime('%Y-%m-%d %H:%M:%S'),
+             'fim': _inicio_do_dia_utc(fim + datetime.timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')}).all()
+
+def em_todas_as_lojas(funcao, *args):
+    """Executa funcao(loja, engine, *args) em paralelo para todas as lojas; retorna [(loja, resultado)]."""
+    # As engines são obtidas aqui, no contexto da requisição; as threads só as usam
+    engines = {loja: engine_loja(loja) for loja in app.config['LOJAS']}
+    with ThreadPoolExecutor(max_workers=min(len(engines), 8)) as executor:
+        return list(zip(engines, executor.map(lambda loja: funcao(loja, engines[loja], *args), engines)))
+
+@app.route('/admin/lojas')
+@login_required
+@admin_required
+def admin_lojas():
+    """Resumo do dia de todas as lojas."""
+    resumos = [resumo for _, resumo in em_todas_as_lojas(_resumo_loja)]
+    hoje = agora_loja().date()
+    return render_template('admin/lojas.html', resumos=resumos,
+                           inicio_padrao=hoje.replace(day=1).isoformat(), fim_padrao=hoje.isoformat())
+
+@app.route('/admin/lojas/exportar.csv')
+@login_required
+@admin_required
+def exportar_pedidos_lojas():
+    """Exporta em CSV os pedidos de todas as lojas no período escolhido."""
+    try:
+        inicio = datetime.date.fromisoformat(request.args['inicio'])
+        fim = datetime.date.fromisoformat(request.args['fim'])
+    except (KeyError, ValueError):
+        flash('Período inválido.', 'error')
+        return redirect(url_for('admin_lojas'))
+
+    resultados = em_todas_as_lojas(_pedidos_loja, inicio, fim)
+
+    def gerar():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(['loja', 'pedido_id', 'cliente_id', 'data_pedido', 'valor_total', 'desconto', 'status'])
+        for loja, linhas in resultados:
+            for linha in linhas:
+                escritor.writerow([loja, *linha])
+                if buffer.tell() > 64 * 1024:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+        yield buffer.getvalue()
+
+    nome = f'pedidos_{inicio.isoformat()}_{fim.isoformat()}.csv'
+    return Response(gerar(), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={nome}'})
+
+
+# --- PROFILER POR REQUISIÇÃO ---
+# Documentação: Desligado por padrão (PROFILER_ATIVO). Quando ligado, perfila
+# uma fração PROFILER_AMOSTRAGEM das requisições, ou a requisição de um admin
+# que envie o cabeçalho "X-Profile: 1". As demais requisições só pagam um
+# sorteio aleatório.
+
+PASTA_PROFILES = os.path.join(instance_path, 'profiles')
+
+@app.before_request
+def iniciar_profiler():
+    if not app.config['PROFILER_ATIVO']:
+        return
+    pedido_admin = request.headers.get('X-Profile') == '1' and session.get('is_admin')
+    if pedido_admin or random.random() < app.config['PROFILER_AMOSTRAGEM']:
+        g.profiler = profiler.Sessao(app.config['PROFILER_MODO'], app.config['PROFILER_INTERVALO'])
+
+@app.after_request
+def finalizar_profiler(response):
+    sessao = g.pop('profiler', None)
+    if sessao is not None:
+        sessao.finalizar(PASTA_PROFILES, {
+            'rota': request.url_rule.rule if request.url_rule else request.path,
+            'caminho': request.full_path.rstrip('?'),
+            'metodo': request.method,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'loja': g.get('loja'),
+        }, app.config['PROFILER_MAXIMO'])
+    return response
+
+@app.route('/admin/profiles')
+@login_required
+@admin_required
+def admin_profiles():
+    """Lista os perfis mais lentos entre os salvos recentemente."""
+    return render_template('admin/profiles.html', perfis=profiler.listar(PASTA_PROFILES, 50),
+                           ativo=app.config['PROFILER_ATIVO'])
+
+@app.route('/admin/profiles/<nome>')
+@login_required
+@admin_required
+def baixar_profile(nome):
+    """Baixa um arquivo de perfil (.folded ou .prof)."""
+    if not nome.endswith(tuple(profiler.EXTENSOES.values())):
+        abort(404)
+    return send_from_directory(PASTA_PROFILES, nome, as_attachment=True)
+
+
+# --- HORÁRIOS DE RETIRADA/ENTREGA ---
+# Documentação: O dia é dividido em horários de AGENDA_MINUTOS minutos. Cada
+# horário tem uma linha em ocupacao_horario com a capacidade da cozinha (em
+# unidades de preparo) e o total já reservado. As faixas do admin são compiladas,
+# uma vez por versão, em uma tabela indexada pelo horário do dia, e as linhas só
+# existem dentro do horizonte oferecido ao cliente: listar os horários livres lê
+# no máximo AGENDA_HORIZONTE horas de linhas, qualquer que seja o movimento.
+
+_tabela_capacidade = {} # loja -> (versão, capacidade de cada horário do dia)
+_horarios_garantidos = {} # loja -> (versão, último horário já criado por este processo)
+
+def agora_loja():
+    """Data e hora atuais no fuso da loja (o mesmo usado nos relatórios)."""
+    return datetime.datetime.utcnow() + datetime.timedelta(hours=app.config['ANALYTICS_FUSO_HORARIO'])
+
+def _minutos(hora):
+    """'HH:MM' -> minutos desde a meia-noite."""
+    horas, minutos = hora.split(':')
+    return int(horas) * 60 + int(minutos)
+
+def tabela_capacidade():
+    """Capacidade de cada horário do dia (lista indexada por minutos // AGENDA_MINUTOS)."""
+    versao = versao_atual('capacidade')
+    compilada = _tabela_capacidade.get(g.loja)
+    if compilada is None or compilada[0] != versao:
+        passo = app.config['AGENDA_MINUTOS']
+        abertura = _minutos(app.config['AGENDA_ABERTURA'])
+        fechamento = _minutos(app.config['AGENDA_FECHAMENTO'])
+        tabela = [app.config['AGENDA_CAPACIDADE_PADRAO'] if abertura <= i * passo < fechamento else 0
+                  for i in range(24 * 60 // passo)]
+        for faixa in CapacidadeHorario.query.order_by(CapacidadeHorario.inicio):
+            for i in range(_minutos(faixa.inicio) // passo, -(-_minutos(faixa.fim) // passo)):
+                tabela[i] = faixa.capacidade
+        compilada = _tabela_capacidade[g.loja] = (versao, tabela)
+    return compilada[1]
+
+def capacidade_do_horario(inicio):
+    return tabela_capacidade()[(inicio.hour * 60 + inicio.minute) // app.config['AGENDA_MINUTOS']]
+
+def janela_horarios():
+    """(primeiro, limite): o intervalo de horários que pode ser escolhido agora."""
+    passo = app.config['AGENDA_MINUTOS']
+    minimo = agora_loja() + datetime.timedelta(minutes=app.config['AGENDA_ANTECEDENCIA'])
+    # Arredonda para cima até o próximo início de horário
+    minutos = minimo.hour * 60 + minimo.minute + (1 if minimo.second or minimo.microsecond else 0)
+    primeiro = minimo.replace(hour=0, minute=0, second=0, microsecond=0) + \
+        datetime.timedelta(minutes=-(-minutos // passo) * passo)
+    return primeiro, primeiro + datetime.timedelta(hours=app.config['AGENDA_HORIZONTE'])
+
+def garantir_horarios():
+    """Cria as linhas de ocupação que faltam até o fim do horizonte (com a capacidade atual)."""
+    primeiro, limite = janela_horarios()
+    versao = versao_atual('capacidade')
+    if _horarios_garantidos.get(g.loja) == (versao, limite):
+        return
+    passo = datetime.timedelta(minutes=app.config['AGENDA_MINUTOS'])
+    existentes = {inicio for (inicio,) in db.session.query(OcupacaoHorario.inicio)
+                  .filter(OcupacaoHorario.inicio >= primeiro, OcupacaoHorario.inicio < limite)}
+    # Compila a tabela antes dos add(): consultá-la depois faria o autoflush das
+    # linhas novas fora do try abaixo
+    tabela = tabela_capacidade()
+    inicio = primeiro
+    while inicio < limite:
+        if inicio not in existentes:
+            capacidade = tabela[(inicio.hour * 60 + inicio.minute) // app.config['AGENDA_MINUTOS']]
+            db.session.add(OcupacaoHorario(inicio=inicio, capacidade=capacidade, reservado=0))
+        inicio += passo
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Outro worker criou as mesmas linhas ao mesmo tempo
+        db.session.rollback()
+    _horarios_garantidos[g.loja] = (versao, limite)
+
+def horarios_disponiveis(carga):
+    """Os AGENDA_OPCOES horários mais próximos em que ainda cabe um pedido com essa carga."""
+    garantir_horarios()
+    primeiro, limite = janela_horarios()
+    return OcupacaoHorario.query.filter(
+        OcupacaoHorario.inicio >= primeiro,
+        OcupacaoHorario.inicio < limite,
+        OcupacaoHorario.capacidade > 0,
+        OcupacaoHorario.capacidade - OcupacaoHorario.reservado >= carga,
+    ).order_by(OcupacaoHorario.inicio).limit(app.config['AGENDA_OPCOES']).all()
+
+def ler_horario(valor):
+    """Converte o horário enviado pelo formulário ('AAAA-MM-DDTHH:MM'); None se inválido ou fora da janela."""
+    try:
+        inicio = datetime.datetime.strptime(valor or '', '%Y-%m-%dT%H:%M')
+    except ValueError:
+        return None
+    primeiro, limite = janela_horarios()
+    if not primeiro <= inicio < limite or inicio.minute % app.config['AGENDA_MINUTOS']:
+        return None
+    return inicio
+
+def reservar_horario(inicio, carga):
+    """Reserva a carga no horário com um UPDATE condicional; False se o horário lotou."""
+    return OcupacaoHorario.query.filter(
+        OcupacaoHorario.inicio == inicio,
+        OcupacaoHorario.capacidade > 0,
+        OcupacaoHorario.reservado + carga <= OcupacaoHorario.capacidade,
+    ).update({OcupacaoHorario.reservado: OcupacaoHorario.reservado + carga}, synchronize_session=False) == 1
+
+def liberar_horario(inicio, carga):
+    """Devolve a carga ao horário, ex.: pedido cancelado."""
+    OcupacaoHorario.query.filter_by(inicio=inicio).update(
+        {OcupacaoHorario.reservado: OcupacaoHorario.reservado - carga}, synchronize_session=False)
+
+def itens_e_carga(carrinho):
+    """Itens (produto_id, quantidade) do carrinho que ainda existem e a carga de preparo total."""
+    ids_carrinho = [int(produto_id_str) for produto_id_str in carrinho]
+    cargas = dict(db.session.query(Produto.id, Produto.carga_preparo).filter(Produto.id.in_(ids_carrinho)))
+    itens = [(produto_id, carrinho[str(produto_id)]['quantidade'])
+             for produto_id in ids_carrinho if produto_id in cargas]
+    return itens, sum(cargas[produto_id] * quantidade for produto_id, quantidade in itens)
+
+@app.route('/admin/capacidade', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def admin_capacidade():
+    """Faixas de capacidade da cozinha por horário do dia e ocupação dos próximos horários."""
+    if request.method == 'POST':
+        inicio = request.form['inicio']
+        fim = request.form['fim']
+        try:
+            capacidade = int(request.form['capacidade'])
+            if capacidade < 0 or not 0 <= _minutos(inicio) < _minutos(fim) <= 24 * 60:
+                raise ValueError
+        except ValueError:
+            flash('Informe um intervalo HH:MM válido (início antes do fim) e uma capacidade não negativa.', 'error')
+            return redirect(url_for('admin_capacidade'))
+        db.session.add(CapacidadeHorario(inicio=inicio, fim=fim, capacidade=capacidade))
+        alterar_capacidades()
+        flash('Faixa de capacidade cadastrada!', 'success')
+        return redirect(url_for('admin_capacidade'))
+
+    garantir_horarios()
+    primeiro, limite = janela_horarios()
+    proximos = OcupacaoHorario.query.filter(OcupacaoHorario.inicio >= primeiro, OcupacaoHorario.inicio < limite) \
+        .order_by(OcupacaoHorario.inicio).all()
+    faixas = CapacidadeHorario.query.order_by(CapacidadeHorario.inicio).all()
+    return render_template('admin/capacidade.html', faixas=faixas, proximos=proximos,
+                           padrao=app.config['AGENDA_CAPACIDADE_PADRAO'],
+                           abertura=app.config['AGENDA_ABERTURA'], fechamento=app.config['AGENDA_FECHAMENTO'])
+
+@app.route('/admin/capacidade/deletar/<int:faixa_id>', methods=['POST'])
+@login_required
+@admin_required
+def deletar_capacidade(faixa_id):
+    """Remove uma faixa de capacidade."""
+    db.session.delete(CapacidadeHorario.query.get_or_404(faixa_id))
+    alterar_capacidades()
+    flash('Faixa de capacidade removida.', 'success')
+    return redirect(url_for('admin_capacidade'))
+
+def alterar_capacidades():
+    """Recompila as faixas e aplica a nova capacidade aos horários futuros já criados."""
+    incrementar_versao('capacidade')
+    db.session.flush()
+    _tabela_capacidade.pop(g.loja, None)
+    for ocupacao in OcupacaoHorario.query.filter(OcupacaoHorario.inicio >= agora_loja()):
+        ocupacao.capacidade = capacidade_do_horario(ocupacao.inicio)
+    db.session.commit()
+
+
+# --- APLICATIVO (PWA) ---
+# Documentação: O service worker (templates/sw.js) guarda os estáticos com
+# cache-first e o cardápio com stale-while-revalidate. O HTML do cardápio é o
+# mesmo para todos os visitantes; o que depende da sessão (nome, itens no
+# carrinho, mensagens flash) é preenchido no navegador por /sessao.json.
+# Carrinho, checkout, login e admin nunca passam pelo cache.
+
+ESTATICOS_PWA = ['css/style.css', 'img/icone.svg']
+
+@app.route('/manifest.webmanifest')
+def manifesto():
+    """Web app manifest: permite instalar o cardápio na tela inicial do celular."""
+    nome = app.config['LOJAS'].get(g.loja)
+    return jsonify({
+        'name': nome,
+        'short_name': nome,
+        'start_url': url_for('cardapio'),
+        'scope': url_for('index'),
+        'display': 'standalone',
+        'background_color': '#fdfaf6',
+        'theme_color': '#ffc107',
+        'icons': [{'src': url_for('static', filename='img/icone.svg'), 'sizes': 'any', 'type': 'image/svg+xml'}],
+    }), 200, {'Content-Type': 'application/manifest+json'}
+
+@app.route('/sw.js')
+def service_worker():
+    """Service worker, servido da raiz da loja para que seu escopo cubra todas as páginas dela."""
+    corpo = render_template('sw.js', versao=VERSAO_ARQUIVOS, cardapio=url_for('cardapio'),
+                            prefixo_estaticos=url_for('static', filename=''),
+                            estaticos=[url_for('static', filename=nome, v=VERSAO_ARQUIVOS)
+                                       for nome in ESTATICOS_PWA])
+    return Response(corpo, mimetype='application/javascript', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/sessao.json')
+def sessao_json():
+    """Dados da sessão exibidos no cabeçalho das páginas compartilhadas (ex.: cardápio em cache)."""
+    carrinho = session.get('carrinho', {})
+    resposta = jsonify({
+        'cliente_nome': session.get('cliente_nome') if 'cliente_id' in session else None,
+        'is_admin': bool(session.get('is_admin')),
+        'itens_carrinho': sum(item['quantidade'] for item in carrinho.values()),
+        'mensagens': get_flashed_messages(with_categories=True),
+    })
+    resposta.headers['Cache-Control'] = 'no-store'
+    return resposta
+
+
+# --- IMPRESSÃO DOS TICKETS DA COZINHA ---
+# Documentação: O checkout só grava o ticket em ticket_impressao, na mesma
+# transação do pedido; montar o ESC/POS e falar com a impressora fica a cargo
+# do impressao.py, então o checkout nunca espera pela impressora.
+
+def dados_ticket(pedido):
+    """Conteúdo do ticket de um pedido (pedido, cliente e itens), no formato de impressao.py."""
+    cliente = db.session.get(Cliente, pedido.cliente_id)
+    itens = db.session.execute(
+        db.select(Produto.nome, itens_pedido.c.quantidade)
+        .select_from(itens_pedido)
+        .outerjoin(Produto, Produto.id == itens_pedido.c.produto_id)
+        .where(itens_pedido.c.pedido_id == pedido.id)
+        .order_by(Produto.carga_preparo.desc(), Produto.categoria, Produto.nome)) # o que vai ao fogo primeiro
+    data_local = pedido.data_pedido + datetime.timedelta(hours=app.config['ANALYTICS_FUSO_HORARIO'])
+    return {
+        'loja': app.config['LOJAS'].get(g.loja),
+        'pedido_id': pedido.id,
+        'data': data_local.strftime('%d/%m/%Y %H:%M'),
+        'horario': pedido.horario.strftime('%H:%M') if pedido.horario else None,
+        'cliente': cliente.nome,
+        'telefone': cliente.telefone,
+        'endereco': f'{cliente.endereco} - CEP {formatar_cep(cliente.cep)}' if pedido.entrega else 'RETIRADA NA LOJA',
+        'itens': [{'nome': nome or 'Produto removido', 'quantidade': quantidade} for nome, quantidade in itens],
+        'valor_total': round(pedido.valor_total, 2),
+    }
+
+def enfileirar_ticket(pedido, reimpressao=False):
+    """Coloca o ticket do pedido na fila de impressão da loja (na transação atual).
+
+    Retorna False se a loja não tem impressora configurada.
+    """
+    if not impressao.destino_da_loja(g.loja, app.config):
+        return False
+    db.session.flush() # garante data_pedido e itens gravados antes de montar o ticket
+    db.session.add(TicketImpressao(pedido_id=pedido.id, dados=json.dumps(dados_ticket(pedido)),
+                                   reimpressao=reimpressao))
+    return True
+
+@app.route('/admin/impressao')
+@login_required
+@admin_required
+def admin_impressao():
+    """Fila de impressão da cozinha: últimos tickets e seus status."""
+    tickets = TicketImpressao.query.order_by(TicketImpressao.id.desc()).limit(100).all()
+    return render_template('admin/impressao.html', tickets=tickets,
+                           destino=impressao.destino_da_loja(g.loja, app.config))
+
+@app.route('/admin/pedido/<int:pedido_id>/reimprimir', methods=['POST'])
+@login_required
+@admin_required
+def reimprimir_pedido(pedido_id):
+    """Coloca uma nova via do ticket do pedido na fila de impressão."""
+    pedido = Pedido.query.get_or_404(pedido_id)
+    if not enfileirar_ticket(pedido, reimpressao=True):
+        flash('Esta loja não tem impressora configurada.', 'warning')
+        return redirect(url_for('admin_impressao'))
+    db.session.commit()
+    flash(f'Ticket do pedido #{pedido.id} enviado para a fila de impressão.', 'success')
+    return redirect(url_for('admin_impressao'))
+
+
+# --- LGPD: EXPORTAÇÃO E EXCLUSÃO DE DADOS ---
+# Documentação: A exportação é gerada em streaming, loja por loja, direto das
+# engines. A exclusão anonimiza o cadastro na hora e deixa para o job
+# (lgpd.py) as cópias dos dados pessoais ligadas aos pedidos (tickets de
+# impressão e notificações, nas tabelas e nos arquivos dos destinos "arquivo"),
+# em lotes de LGPD_LOTE pedidos, cada lote em sua própria transação. Os baldes
+# do limitador de tentativas com o telefone são apagados na hora. Os pedidos
+# continuam ligados ao cadastro anonimizado, então faturamento, mix de
+# produtos e taxa de recompra não mudam.
+
+# Solicitações "executando" sem progresso há mais tempo que isso são retomadas
+PRAZO_JOB_LGPD = datetime.timedelta(minutes=5)
+ANONIMIZADO = 'Anonimizado'
+# Campos com dados pessoais nos tickets e nas notificações, e o que fica no lugar
+SEM_DADOS_PESSOAIS = {'cliente': ANONIMIZADO, 'telefone': '', 'endereco': ''}
+
+def _pedidos_do_cliente(engine, cliente_id):
+    """Gera os pedidos de um cliente em uma loja, com os itens, lendo em streaming."""
+    with engine.connect() as conexao:
+        linhas = conexao.execution_options(stream_results=True, yield_per=500).execute(db.text(
+            "SELECT p.id, p.data_pedido, p.status, p.valor_total, p.desconto, p.horario, pr.nome, i.quantidade "
+            "FROM pedido p LEFT JOIN itens_pedido i ON i.pedido_id = p.id "
+            "LEFT JOIN produto pr ON pr.id = i.produto_id "
+            "WHERE p.cliente_id = :cliente_id ORDER BY p.id"), {'cliente_id': cliente_id})
+        pedido = None
+        for pedido_id, data, status, valor_total, desconto, horario, nome, quantidade in linhas:
+            if pedido is None or pedido['id'] != pedido_id:
+                if pedido is not None:
+                    yield pedido
+                pedido = {'id': pedido_id, 'data_pedido': data, 'status': status, 'valor_total': valor_total,
+                          'desconto': desconto, 'horario': horario, 'itens': []}
+            if quantidade is not None:
+                pedido['itens'].append({'produto': nome or 'Produto removido', 'quantidade': quantidade})
+        if pedido is not None:
+            yield pedido
+
+@app.route('/meus_dados')
+@login_required
+def meus_dados():
+    """Página de privacidade: download dos dados e pedido de exclusão."""
+    cliente = db.session.get(Cliente, session['cliente_id'])
+    return render_template('meus_dados.html', cliente=cliente)
+
+@app.route('/meus_dados/exportar.json')
+@login_required
+def exportar_meus_dados():
+    """Baixa, em JSON, o cadastro e todos os pedidos do cliente em todas as lojas."""
+    cliente = db.session.get(Cliente, session['cliente_id'])
+    cadastro = {
+        'nome': cliente.nome,
+        'telefone': cliente.telefone,
+        'endereco': cliente.endereco,
+        'cep': cliente.cep,
+        'loja_cadastro': cliente.loja,
+        'consentimento_lgpd': cliente.consentimento_lgpd,
+        'data_cadastro': cliente.data_cadastro.isoformat() if cliente.data_cadastro else None,
+    }
+    # As engines são obtidas aqui, no contexto da requisição; o gerador só as usa
+    engines = {loja: engine_loja(loja) for loja in app.config['LOJAS']}
+    cliente_id = cliente.id
+
+    def gerar():
+        yield '{"cliente": ' + json.dumps(cadastro, ensure_ascii=False) + ', "pedidos": ['
+        separador = ''
+        for loja, engine in engines.items():
+            for pedido in _pedidos_do_cliente(engine, cliente_id):
+                pedido['loja'] = loja
+                yield separador + json.dumps(pedido, ensure_ascii=False, default=str)
+                separador = ', '
+        yield ']}'
+
+    return Response(gerar(), mimetype='application/json',
+                    headers={'Content-Disposition': 'attachment; filename=meus_dados.json'})
+
+@app.route('/meus_dados/excluir', methods=['POST'])
+@login_required
+def excluir_meus_dados():
+    """Anonimiza o cadastro do cliente e agenda a limpeza dos dados ligados aos pedidos."""
+    cliente = db.session.get(Cliente, session['cliente_id'])
+    if not cliente.check_senha(request.form.get('senha', '')):
+        flash('Senha incorreta.', 'error')
+        return redirect(url_for('meus_dados'))
+    if cliente.is_admin:
+        flash('Contas de administrador não podem ser excluídas por aqui.', 'error')
+        return redirect(url_for('meus_dados'))
+
+    limitador.apagar([f'{rota}:telefone:{cliente.telefone}' for rota in app.config['RATE_LIMITS']])
+    cliente.nome = ANONIMIZADO
+    cliente.telefone = f'anonimo-{cliente.id}'
+    cliente.endereco = ''
+    cliente.cep = None
+    cliente.set_senha(os.urandom(16).hex()) # ninguém mais consegue entrar nesta conta
+    cliente.consentimento_lgpd = False
+    db.session.add(SolicitacaoLGPD(cliente_id=cliente.id))
+    db.session.commit()
+
+    session.clear()
+    flash('Seus dados pessoais foram excluídos. Obrigado por ter sido nosso cliente!', 'info')
+    return redirect(url_for('index'))
+
+def reservar_solicitacao_lgpd():
+    """Marca como "executando" a próxima solicitação pendente (ou abandonada) e a retorna."""
+    agora = datetime.datetime.utcnow()
+    disponivel = db.or_(SolicitacaoLGPD.status == 'pendente',
+                        db.and_(SolicitacaoLGPD.status == 'executando',
+                                SolicitacaoLGPD.atualizado_em < agora - PRAZO_JOB_LGPD))
+    candidata = db.session.query(SolicitacaoLGPD.id).filter(disponivel).order_by(SolicitacaoLGPD.id).first()
+    reservada = candidata is not None and SolicitacaoLGPD.query.filter(
+        SolicitacaoLGPD.id == candidata.id, disponivel).update(
+        {SolicitacaoLGPD.status: 'executando', SolicitacaoLGPD.atualizado_em: agora},
+        synchronize_session=False) == 1
+    db.session.commit()
+    return db.session.get(SolicitacaoLGPD, candidata.id) if reservada else None
+
+def reescrever_arquivo(caminho, reescrever):
+    """Troca o conteúdo do arquivo por reescrever(conteúdo), sob a trava exclusiva que os
+    workers também pegam para acrescentar. Arquivos inexistentes e dispositivos são ignorados."""
+    if not os.path.isfile(caminho):
+        return
+    with open(caminho, 'r+b') as arquivo:
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        conteudo = arquivo.read()
+        novo = reescrever(conteudo)
+        if novo != conteudo:
+            arquivo.seek(0)
+            arquivo.write(novo)
+            arquivo.truncate()
+
+def _anonimizar_log_notificacoes(loja, ids):
+    """Remove os dados pessoais das linhas do canal 'arquivo' sobre os pedidos `ids` da loja."""
+    caminho = app.config['NOTIFICACAO_ARQUIVO']
+    if not os.path.isabs(caminho):
+        caminho = os.path.join(app.instance_path, caminho)
+    ids = set(ids)
+
+    def reescrever(conteudo):
+        linhas = conteudo.decode('utf-8').splitlines(keepends=True)
+        for i, linha in enumerate(linhas):
+            try:
+                mensagem = json.loads(linha)
+                payload = mensagem['payload']
+                if payload.get('loja') != loja or payload.get('pedido_id') not in ids:
+                    continue
+            except (ValueError, KeyError, TypeError, AttributeError):
+                continue
+            if mensagem.get('destino') == payload.get('telefone'):
+                mensagem['destino'] = ANONIMIZADO
+            payload.update(SEM_DADOS_PESSOAIS)
+            linhas[i] = json.dumps(mensagem, ensure_ascii=False) + '\n'
+        return ''.join(linhas).encode('utf-8')
+
+    reescrever_arquivo(caminho, reescrever)
+
+def _anonimizar_arquivo_impressora(loja, tickets):
+    """Troca, no arquivo da impressora da loja, cada ticket impresso pela versão anonimizada.
+
+    `tickets`: [(dados originais, reimpressao)]. Os tickets são montados de novo com
+    renderizar_ticket, byte a byte iguais aos que foram gravados no arquivo.
+    """
+    esquema, _, endereco = impressao.destino_da_loja(loja, app.config).partition(':')
+    if esquema != 'arquivo' or not tickets:
+        return
+    colunas = app.config['IMPRESSORA_COLUNAS']
+    trocas = [(impressao.renderizar_ticket(dados, reimpressao, colunas),
+               impressao.renderizar_ticket(dict(dados, **SEM_DADOS_PESSOAIS), reimpressao, colunas))
+              for dados, reimpressao in tickets]
+
+    def reescrever(conteudo):
+        for original, anonimo in trocas:
+            conteudo = conteudo.replace(original, anonimo)
+        return conteudo
+
+    reescrever_arquivo(impressao.caminho_do_arquivo(endereco, {'INSTANCE_PATH': app.instance_path}), reescrever)
+
+def anonimizar_lote_pedidos(cliente_id, loja, depois_de):
+    """Remove os dados pessoais ligados ao próximo lote de pedidos do cliente na loja.
+
+    Os pedidos em si não guardam dados pessoais e não são alterados. Os arquivos
+    são reescritos antes do commit: se o job parar entre os dois, o lote é
+    tratado de novo. Retorna os ids tratados (lista vazia quando não há mais
+    pedidos depois de `depois_de`).
+    """
+    with contexto_loja(loja):
+        ids = [pedido_id for (pedido_id,) in db.session.query(Pedido.id)
+               .filter(Pedido.cliente_id == cliente_id, Pedido.id > depois_de)
+               .order_by(Pedido.id).limit(app.config['LGPD_LOTE'])]
+        if not ids:
+            return ids
+        impressos = []
+        for ticket in TicketImpressao.query.filter(TicketImpressao.pedido_id.in_(ids)):
+            dados = json.loads(ticket.dados)
+            impressos.append((dict(dados), ticket.reimpressao))
+            dados.update(SEM_DADOS_PESSOAIS)
+            ticket.dados = json.dumps(dados)
+        for notificacao in NotificacaoOutbox.query.filter(NotificacaoOutbox.pedido_id.in_(ids)):
+            payload = json.loads(notificacao.payload)
+            if notificacao.destino == payload.get('telefone'):
+                # Mensagem para o próprio cliente: o destino também é dado pessoal
+                notificacao.destino = ANONIMIZADO
+                if notificacao.status == 'pendente':
+                    notificacao.status = 'morto'
+                    notificacao.ultimo_erro = 'Dados excluídos a pedido do cliente (LGPD)'
+            payload.update(SEM_DADOS_PESSOAIS)
+            notificacao.payload = json.dumps(payload)
+        _anonimizar_arquivo_impressora(loja, impressos)
+        _anonimizar_log_notificacoes(loja, ids)
+        db.session.commit()
+        return ids
+
+def executar_solicitacao_lgpd(solicitacao):
+    """Trata todos os pedidos do cliente, loja por loja, gravando o progresso a cada lote."""
+    progresso = json.loads(solicitacao.progresso)
+    for loja in app.config['LOJAS']:
+        # progresso[loja]: último pedido tratado, ou None quando a loja terminou
+        while progresso.get(loja, 0) is not None:
+            ids = anonimizar_lote_pedidos(solicitacao.cliente_id, loja, progresso.get(loja, 0))
+            progresso[loja] = ids[-1] if ids else None
+            solicitacao.progresso = json.dumps(progresso)
+            solicitacao.pedidos_tratados += len(ids)
+            solicitacao.atualizado_em = datetime.datetime.utcnow()
+            db.session.commit()
+            if ids:
+                time.sleep(app.config['LGPD_PAUSA']) # deixa o checkout pegar o lock entre os lotes
+    solicitacao.status = 'concluida'
+    solicitacao.concluido_em = datetime.datetime.utcnow()
+    db.session.commit()
+
+@app.route('/admin/lgpd')
+@login_required
+@admin_required
+def admin_lgpd():
+    """Solicitações de exclusão de dados e seu progresso."""
+    solicitacoes = SolicitacaoLGPD.query.order_by(SolicitacaoLGPD.id.desc()).limit(100).all()
+    return render_template('admin/lgpd.html', solicitacoes=solicitacoes)
+
+
+# --- ACOMPANHAMENTO DO PEDIDO ---
+# Documentação: A previsão de um pedido vem da fila da cozinha (fila_preparo):
+# o trabalho à frente dele (posicao_fila - saida) dividido pelo ritmo recente da
+# cozinha, em unidades de preparo por minuto. O ritmo é uma média com peso que
+# decai em ACOMPANHAMENTO_JANELA minutos (só conta o tempo em que havia fila),
+# suavizada pelo ritmo nominal da capacidade do horário. Tudo é mantido a cada
+# entrada/saída da fila; nenhuma consulta percorre os pedidos abertos.
+# As atualizações ao vivo saem do acompanhamento.py (Server-Sent Events, asyncio):
+# as conexões paradas ficam lá, e não nos workers do gunicorn.
+
+STATUS_FINAIS = ('Entregue', 'Cancelado')
+
+def _decair(fila, agora):
+    """(unidades, minutos) recentes da fila, com o peso decaído até `agora`."""
+    if fila.atualizado_em is None:
+        return fila.unidades_recentes, fila.minutos_recentes
+    janela = app.config['ACOMPANHAMENTO_JANELA']
+    decorrido = max((agora - fila.atualizado_em).total_seconds() / 60, 0.0)
+    peso = math.exp(-decorrido / janela)
+    minutos = fila.minutos_recentes * peso
+    if fila.entrada > fila.saida:
+        # Integral do peso no intervalo em que a fila estava ocupada
+        minutos += janela * (1 - peso)
+    return fila.unidades_recentes * peso, minutos
+
+def _ler_fila():
+    return db.session.execute(db.select(FilaPreparo.__table__).where(FilaPreparo.id == 1)).one_or_none()
+
+def movimentar_fila(entrada=0, saida=0, pronta=0):
+    """Registra carga entrando/saindo da fila da cozinha; retorna o novo total de entrada.
+
+    `pronta` é a parte da saída que foi preparada (conta para o ritmo). Usa um
+    UPDATE condicional na versão da linha e tenta de novo se outro worker mexeu nela.
+    """
+    agora = datetime.datetime.utcnow()
+    while True:
+        fila = _ler_fila()
+        if fila is None:
+            db.session.add(FilaPreparo(id=1, versao=1, entrada=entrada, saida=saida, unidades_recentes=float(pronta),
+                                       minutos_recentes=0.0, atualizado_em=agora))
+            db.session.flush()
+            return entrada
+        unidades, minutos = _decair(fila, agora)
+        atualizado = FilaPreparo.query.filter_by(id=1, versao=fila.versao).update({
+            FilaPreparo.versao: fila.versao + 1,
+            FilaPreparo.entrada: fila.entrada + entrada,
+            FilaPreparo.saida: fila.saida + saida,
+            FilaPreparo.unidades_recentes: unidades + pronta,
+            FilaPreparo.minutos_recentes: minutos,
+            FilaPreparo.atualizado_em: agora,
+        }, synchronize_session=False)
+        if atualizado:
+            return fila.entrada + entrada
+
+def ritmo_preparo(fila, agora):
+    """Unidades de preparo por minuto que a cozinha tem feito."""
+    nominal = (capacidade_do_horario(agora_loja()) or app.config['AGENDA_CAPACIDADE_PADRAO'] or 1) \
+        / app.config['AGENDA_MINUTOS']
+    unidades, minutos = _decair(fila, agora) if fila is not None else (0.0, 0.0)
+    # O ritmo nominal entra como ACOMPANHAMENTO_MINUTOS_NOMINAIS minutos de observação:
+    # com pouco histórico prevalece a capacidade configurada, com fila constante, o medido
+    peso = app.config['ACOMPANHAMENTO_MINUTOS_NOMINAIS']
+    return (unidades + nominal * peso) / (minutos + peso)
+
+def estados_acompanhamento(pedido_ids):
+    """{pedido_id: estado} com status e previsão de cada pedido (uma leitura da fila para todos)."""
+    fila = _ler_fila()
+    agora = datetime.datetime.utcnow()
+    ritmo = ritmo_preparo(fila, agora)
+    local = agora_loja()
+    estados = {}
+    for pedido in db.session.query(Pedido.id, Pedido.status, Pedido.horario, Pedido.carga_preparo, Pedido.posicao_fila) \
+            .filter(Pedido.id.in_(pedido_ids)):
+        estado = {'pedido_id': pedido.id, 'status': pedido.status, 'final': pedido.status in STATUS_FINAIS,
+                  'horario': pedido.horario.strftime('%H:%M') if pedido.horario else None}
+        if pedido.status in STATUS_ABERTOS:
+            if fila is not None and pedido.posicao_fila is not None:
+                a_frente = max(pedido.posicao_fila - fila.saida, 0)
+            else:
+                a_frente = pedido.carga_preparo
+            previsao = local + datetime.timedelta(minutes=math.ceil(a_frente / ritmo))
+            # Não fica pronto antes do horário escolhido
+            if pedido.horario is not None and pedido.horario > previsao:
+                previsao = pedido.horario
+            estado.update(carga_a_frente=a_frente, previsao=previsao.strftime('%H:%M'),
+                          minutos=math.ceil((previsao - local).total_seconds() / 60))
+        estados[pedido.id] = estado
+    return estados
+
+def _serializador_acompanhamento():
+    return URLSafeTimedSerializer(app.secret_key, salt='acompanhamento')
+
+def token_acompanhamento(pedido):
+    """Token assinado que dá acesso aos eventos de um pedido (usado pelo acompanhamento.py)."""
+    return _serializador_acompanhamento().dumps([g.loja, pedido.id])
+
+def ler_token_acompanhamento(token):
+    """(loja, pedido_id) de um token válido e não expirado; None caso contrário."""
+    try:
+        loja, pedido_id = _serializador_acompanhamento().loads(token, max_age=app.config['ACOMPANHAMENTO_VALIDADE'])
+    except (BadSignature, ValueError, TypeError):
+        return None
+    return (loja, pedido_id) if loja in app.config['LOJAS'] else None
+
+def _pedido_do_cliente(pedido_id):
+    pedido = Pedido.query.get_or_404(pedido_id)
+    if pedido.cliente_id != session['cliente_id']:
+        abort(403)
+    return pedido
+
+@app.route('/pedido/<int:pedido_id>/acompanhar')
+@login_required
+def acompanhar_pedido(pedido_id):
+    """Página de acompanhamento do pedido, atualizada ao vivo."""
+    pedido = _pedido_do_cliente(pedido_id)
+    return render_template('acompanhar_pedido.html', pedido=pedido,
+                           estado=estados_acompanhamento([pedido.id])[pedido.id],
+                           url_eventos=f"{app.config['ACOMPANHAMENTO_URL']}?t={token_acompanhamento(pedido)}",
+                           intervalo_consulta=app.config['ACOMPANHAMENTO_CONSULTA'])
+
+@app.route('/pedido/<int:pedido_id>/acompanhar.json')
+@login_required
+def acompanhar_pedido_json(pedido_id):
+    """Estado atual do pedido; usado pela página quando os eventos ao vivo não estão disponíveis."""
+    pedido = _pedido_do_cliente(pedido_id)
+    return jsonify(estados_acompanhamento([pedido.id])[pedido.id]), 200, {'Cache-Control': 'no-store'}
+
+
+# --- SAÚDE E PRONTIDÃO ---
+# Documentação: /saude/vivo responde sem nenhum I/O (o processo está de pé).
+# /saude/pronto verifica, em paralelo e dentro de SAUDE_ORCAMENTO segundos, a
+# conexão com o banco de cada loja e se o esquema do banco tem todas as tabelas
+# e colunas dos modelos (as que faltam são criadas por criar_tabelas, que o
+# gunicorn não executa). O tamanho das filas de segundo plano vai no JSON, mas
+# não decide o status: fila atrasada é problema do worker, não desta instância.
+# Cada loja tem no máximo uma verificação em andamento por processo; se o banco
+# travar, as sondas seguintes esperam a mesma em vez de enfileirar outras no
+# executor. Durante a drenagem (ver gunicorn.conf.py) responde 503 enquanto as
+# requisições em andamento terminam.
+
+ARQUIVO_DRENAGEM = os.path.join(instance_path, f'drenando-{socket.gethostname()}')
+_executor_saude = ThreadPoolExecutor(max_workers=4)
+_esquema_conferido = set() # lojas cujo esquema já foi conferido por este processo
+_verificacoes_saude = {} # loja -> verificação (Future) mais recente deste processo
+_trava_saude = threading.Lock()
+
+# Filas de segundo plano: tabela -> status que indica item aguardando
+FILAS_SEGUNDO_PLANO = {'notificacao_outbox': 'pendente', 'ticket_impressao': 'pendente'}
+
+def _colunas_faltando(engine, tabelas):
+    """Tabelas/colunas dos modelos que não existem no banco (migração pendente)."""
+    inspetor = db.inspect(engine)
+    existentes = set(inspetor.get_table_names())
+    faltando = []
+    for tabela in tabelas:
+        if tabela.name not in existentes:
+            faltando.append(tabela.name)
+            continue
+        colunas = {coluna['name'] for coluna in inspetor.get_columns(tabela.name)}
+        faltando.extend(f'{tabela.name}.{coluna.name}' for coluna in tabela.columns if coluna.name not in colunas)
+    return faltando
+
+def _verificar_loja(loja, engine, tabelas, limites):
+    """Verificações de prontidão do banco de uma loja; retorna {'ok', ...detalhes}."""
+    resultado = {'ok': True}
+    with engine.connect() as conexao:
+        conexao.execute(db.text('SELECT 1'))
+        if loja not in _esquema_conferido:
+            faltando = _colunas_faltando(engine, tabelas)
+            if faltando:
+                return {'ok': False, 'migracoes_pendentes': faltando}
+            _esquema_conferido.add(loja)
+        filas = {}
+        for tabela, status in FILAS_SEGUNDO_PLANO.items():
+            limite = limites.get(tabela)
+            # Conta no máximo limite + 1 linhas: o custo não cresce com o atraso
+            filas[tabela] = conexao.execute(db.text(
+                f'SELECT COUNT(*) FROM (SELECT 1 FROM {tabela} WHERE status = :status LIMIT :limite)'),
+                {'status': status, 'limite': limite + 1 if limite else -1}).scalar()
+        resultado['filas'] = filas
+        # Só informativo: não muda o 'ok'
+        resultado['filas_atrasadas'] = [tabela for tabela, tamanho in filas.items()
+                                        if limites.get(tabela) and tamanho > limites[tabela]]
+    return resultado
+
+@app.route('/saude/vivo')
+def saude_vivo():
+    """Liveness: o processo responde. Não acessa banco nem disco."""
+    return 'ok', 200, {'Content-Type': 'text/plain', 'Cache-Control': 'no-store'}
+
+@app.route('/saude/pronto')
+def saude_pronto():
+    """Readiness: 200 se a instância pode receber tráfego, 503 caso contrário."""
+    inicio = time.perf_counter()
+    if os.path.exists(ARQUIVO_DRENAGEM):
+        return jsonify({'status': 'drenando'}), 503, {'Cache-Control': 'no-store'}
+
+    tabelas_loja = [t for t in db.metadata.sorted_tables if t.name not in TABELAS_GLOBAIS]
+    futuros = {}
+    with _trava_saude:
+        for loja in app.config['LOJAS']:
+            futuro = _verificacoes_saude.get(loja)
+            # Verificação anterior ainda rodando (ex.: banco travado): espera a mesma
+            if futuro is None or futuro.done():
+                tabelas = db.metadata.sorted_tables if loja == LOJA_PADRAO else tabelas_loja
+                futuro = _verificacoes_saude[loja] = _executor_saude.submit(
+                    _verificar_loja, loja, engine_loja(loja), tabelas, app.config['SAUDE_FILAS_MAXIMAS'])
+            futuros[loja] = futuro
+    concurrent.futures.wait(futuros.values(), timeout=app.config['SAUDE_ORCAMENTO'])
+
+    lojas = {}
+    for loja, futuro in futuros.items():
+        if not futuro.done():
+            lojas[loja] = {'ok': False, 'erro': 'tempo esgotado'}
+        elif futuro.exception() is not None:
+            lojas[loja] = {'ok': False, 'erro': f'{type(futuro.exception()).__name__}: {futuro.exception()}'[:200]}
+        else:
+            lojas[loja] = futuro.result()
+    pronto = all(resultado['ok'] for resultado in lojas.values())
+    return jsonify({
+        'status': 'pronto' if pronto else 'indisponivel',
+        'lojas': lojas,
+        'duracao_ms': round((time.perf_counter() - inicio) * 1000, 1),
+    }), 200 if pronto else 503, {'Cache-Control': 'no-store'}
+
+
+# --- ZONAS DE ENTREGA ---
+# Documentação: Cada zona cobre uma faixa de CEPs com taxa e pedido mínimo. As
+# zonas da loja são compiladas, uma vez por versão ('entrega'), em um índice de
+# prefixos: cada faixa vira o menor conjunto de prefixos decimais que a cobre
+# exatamente (ex.: 01000000-01599999 -> "010".."015"), e a zona de um CEP é
+# achada consultando o dicionário com os prefixos do CEP, do maior para o menor
+# (no máximo 9 consultas). Não há geocodificação: só o CEP do cadastro. Zonas
+# não podem se sobrepor. Loja sem zonas entrega em qualquer CEP, sem taxa.
+
+_indice_entrega = {} # loja -> (versão, {prefixo do CEP: zona})
+
+def normalizar_cep(valor):
+    """CEP só com os 8 dígitos, ou None se inválido."""
+    digitos = re.sub(r'\D', '', valor or '')
+    return digitos if len(digitos) == 8 else None
+
+def formatar_cep(cep):
+    return f'{cep[:5]}-{cep[5:]}' if cep else ''
+
+app.add_template_filter(formatar_cep, 'cep')
+
+def ler_faixa_cep(texto):
+    """(inicio, fim) de um prefixo ("01310"), um CEP ou uma faixa ("01000-000 a 01599-999"); None se inválido."""
+    partes = [parte.replace('-', '') for parte in re.findall(r'\d{5}-?\d{3}|\d+', texto or '')]
+    if len(partes) == 1 and 1 <= len(partes[0]) <= 8:
+        prefixo = partes[0]
+        return prefixo.ljust(8, '0'), prefixo.ljust(8, '9')
+    if len(partes) == 2 and all(len(parte) == 8 for parte in partes) and partes[0] <= partes[1]:
+        return partes[0], partes[1]
+    return None
+
+def _prefixos_da_faixa(inicio, fim):
+    """Menor conjunto de prefixos decimais que cobre exatamente a faixa [inicio, fim] de CEPs."""
+    inicio, fim = int(inicio), int(fim)
+    prefixos = []
+    while inicio <= fim:
+        # Maior bloco alinhado (10^k CEPs) que começa em `inicio` e cabe na faixa
+        digitos, bloco = 8, 1
+        while digitos > 0 and inicio % (bloco * 10) == 0 and inicio + bloco * 10 - 1 <= fim:
+            digitos, bloco = digitos - 1, bloco * 10
+        prefixos.append(f'{inicio:08d}'[:digitos])
+        inicio += bloco
+    return prefixos
+
+def indice_entrega():
+    """Índice {prefixo: zona} das zonas da loja atual, recompilado quando as zonas mudam."""
+    versao = versao_atual('entrega')
+    compilado = _indice_entrega.get(g.loja)
+    if compilado is None or compilado[0] != versao:
+        indice = {}
+        for zona in ZonaEntrega.query:
+            dados = {'id': zona.id, 'nome': zona.nome, 'taxa': zona.taxa, 'pedido_minimo': zona.pedido_minimo}
+            for prefixo in _prefixos_da_faixa(zona.cep_inicio, zona.cep_fim):
+                indice[prefixo] = dados
+        compilado = _indice_entrega[g.loja] = (versao, indice)
+    return compilado[1]
+
+def zona_do_cep(cep):
+    """Zona de entrega que atende o CEP (8 dígitos), ou None."""
+    indice = indice_entrega()
+    for tamanho in range(8, -1, -1):
+        zona = indice.get(cep[:tamanho])
+        if zona is not None:
+            return zona
+    return None
+
+def cotar_entrega(cep, total):
+    """Se a loja entrega no CEP para um pedido desse total, com a zona, a taxa e o motivo da recusa."""
+    if not indice_entrega():
+        return {'atende': True, 'zona': None, 'taxa': 0.0, 'motivo': None}
+    if not cep:
+        return {'atende': False, 'zona': None, 'taxa': 0.0,
+                'motivo': 'Informe seu CEP em "Meus Dados" para receber o pedido em casa.'}
+    zona = zona_do_cep(cep)
+    if zona is None:
+        return {'atende': False, 'zona': None, 'taxa': 0.0,
+                'motivo': f'Ainda não entregamos no CEP {formatar_cep(cep)}. Você pode retirar na loja.'}
+    if total < zona['pedido_minimo']:
+        minimo = f"{zona['pedido_minimo']:.2f}".replace('.', ',')
+        return {'atende': False, 'zona': zona['nome'], 'taxa': zona['taxa'],
+                'motivo': f"O pedido mínimo para entrega em {zona['nome']} é R$ {minimo}."}
+    return {'atende': True, 'zona': zona['nome'], 'taxa': zona['taxa'], 'motivo': None}
+
+@app.route('/meus_dados/cep', methods=['POST'])
+@login_required
+def alterar_cep():
+    """Atualiza o CEP de entrega do cliente."""
+    cep = normalizar_cep(request.form.get('cep'))
+    if cep is None:
+        flash('Informe um CEP válido (8 dígitos).', 'error')
+    else:
+        db.session.get(Cliente, session['cliente_id']).cep = cep
+        db.session.commit()
+        flash('CEP atualizado!', 'success')
+    return redirect(url_for('ver_carrinho') if request.form.get('voltar') == 'carrinho' else url_for('meus_dados'))
+
+@app.route('/admin/entrega', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def admin_entrega():
+    """Zonas de entrega da loja por faixa de CEP, com consulta de um CEP."""
+    if request.method == 'POST':
+        faixa = ler_faixa_cep(request.form['ceps'])
+        try:
+            taxa = float(request.form['taxa'].replace(',', '.'))
+            pedido_minimo = float((request.form.get('pedido_minimo') or '0').replace(',', '.'))
+            if faixa is None or taxa < 0 or pedido_minimo < 0:
+                raise ValueError
+        except ValueError:
+            flash('Informe um prefixo de CEP (ex.: 01310) ou uma faixa (ex.: 01000-000 a 01599-999) '
+                  'e valores não negativos.', 'error')
+            return redirect(url_for('admin_entrega'))
+        sobreposta = ZonaEntrega.query.filter(ZonaEntrega.cep_inicio <= faixa[1],
+                                              ZonaEntrega.cep_fim >= faixa[0]).first()
+        if sobreposta is not None:
+            flash(f'Essa faixa se sobrepõe à zona "{sobreposta.nome}".', 'error')
+            return redirect(url_for('admin_entrega'))
+        db.session.add(ZonaEntrega(nome=request.form['nome'], cep_inicio=faixa[0], cep_fim=faixa[1],
+                                   taxa=taxa, pedido_minimo=pedido_minimo))
+        alterar_zonas()
+        flash('Zona de entrega cadastrada!', 'success')
+        return redirect(url_for('admin_entrega'))
+
+    consulta = None
+    if request.args.get('cep'):
+        cep = normalizar_cep(request.args['cep'])
+        consulta = {'cep': request.args['cep'], 'zona': zona_do_cep(cep) if cep else None, 'valido': cep is not None}
+    zonas = ZonaEntrega.query.order_by(ZonaEntrega.cep_inicio).all()
+    return render_template('admin/entrega.html', zonas=zonas, consulta=consulta)
+
+@app.route('/admin/entrega/deletar/<int:zona_id>', methods=['POST'])
+@login_required
+@admin_required
+def deletar_zona(zona_id):
+    """Remove uma zona de entrega."""
+    db.session.delete(ZonaEntrega.query.get_or_404(zona_id))
+    alterar_zonas()
+    flash('Zona de entrega removida.', 'success')
+    return redirect(url_for('admin_entrega'))
+
+def alterar_zonas():
+    """Grava a alteração das zonas; os índices de todos os workers são recompilados pela versão."""
+    incrementar_versao('entrega')
+    db.session.commit()
+    _indice_entrega.pop(g.loja, None)
+
+
 # --- APLICAÇÃO PRINCIPAL ---
 if __name__ == '__main__':
     inicializar_banco() # Executa a função para criar o BD e os produtos
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark do motor de promoções
+
+Compila centenas de promoções ativas sobre um catálogo sintético e mede o
+tempo de compilação e de avaliação de carrinhos de vários tamanhos. Não usa
+o banco de dados.
+
+Uso:
+    python bench_promocoes.py --promocoes 500 --produtos 200
+"""
+
+import argparse
+import random
+import time
+
+from promocoes import MotorPromocoes
+
+CATEGORIAS = ['Pastel Salgado', 'Pastel Doce', 'Bebida']
+
+
+def gerar_regras(quantidade, ids_produtos, rng):
+    """Mistura de combos e descontos progressivos, por produto e por categoria."""
+    regras = []
+    for promocao_id in range(1, quantidade + 1):
+        if rng.random() < 0.5:
+            regra = {'componentes': [
+                {'produtos': rng.sample(ids_produtos, 3), 'quantidade': 1},
+                {'categorias': ['Bebida'], 'quantidade': 1} if rng.random() < 0.3
+                else {'produtos': rng.sample(ids_produtos, 2), 'quantidade': 1},
+            ], 'preco': round(rng.uniform(8, 15), 2)}
+            regras.append((promocao_id, f'Combo {promocao_id}', 'combo', regra))
+        else:
+            alvo = ({'categorias': [rng.choice(CATEGORIAS)]} if rng.random() < 0.1
+                    else {'produtos': rng.sample(ids_produtos, 4)})
+            regra = {'alvo': alvo, 'n': rng.randint(2, 4), 'desconto': rng.choice([10, 25, 50])}
+            regras.append((promocao_id, f'Leve {promocao_id}', 'leve_n', regra))
+    return regras
+
+
+def medir(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mede a compilação e a avaliação do motor de promoções.')
+    parser.add_argument('--promocoes', type=int, default=500, help='promoções ativas (padrão: 500)')
+    parser.add_argument('--produtos', type=int, default=200, help='produtos no catálogo (padrão: 200)')
+    parser.add_argument('--repeticoes', type=int, default=2000, help='avaliações por tamanho de carrinho')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    ids_produtos = list(range(1, args.produtos + 1))
+    catalogo = {produto_id: rng.choice(CATEGORIAS) for produto_id in ids_produtos}
+    precos = {produto_id: round(rng.uniform(3, 12), 2) for produto_id in ids_produtos}
+    regras = gerar_regras(args.promocoes, ids_produtos, rng)
+
+    compilacao = medir(lambda: MotorPromocoes(regras, catalogo), 20)
+    print(f'Compilação de {args.promocoes} promoções: {compilacao * 1000:.2f} ms')
+
+    motor = MotorPromocoes(regras, catalogo)
+    for tamanho in (1, 5, 10, 20, 50):
+        carrinhos = [[(p, precos[p], rng.randint(1, 3)) for p in rng.sample(ids_produtos, tamanho)]
+                     for _ in range(50)]
+        indice = iter(range(10 ** 9))
+        tempo = medir(lambda: motor.avaliar(carrinhos[next(indice) % len(carrinhos)]), args.repeticoes)
+        print(f'Carrinho com {tamanho:>2} produtos: {tempo * 1e6:8.1f} µs por avaliação')
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,97 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
 
+    # Relatórios analíticos: processos do pool e fuso horário (em horas) usado
+    # para converter os horários dos pedidos, gravados em UTC
+    ANALYTICS_WORKERS = int(os.environ.get('ANALYTICS_WORKERS', 2))
+    ANALYTICS_FUSO_HORARIO = int(os.environ.get('ANALYTICS_FUSO_HORARIO', -3))
+
+    # Notificações de pedido (outbox). Canais: "arquivo" (stub local), "webhook",
+    # ou qualquer outro registrado em notificacoes.py. Canal vazio desativa o envio.
+    NOTIFICACAO_CANAL_CLIENTE = os.environ.get('NOTIFICACAO_CANAL_CLIENTE', 'arquivo')
+    NOTIFICACAO_CANAL_LOJA = os.environ.get('NOTIFICACAO_CANAL_LOJA', 'arquivo')
+    NOTIFICACAO_DESTINO_LOJA = os.environ.get('NOTIFICACAO_DESTINO_LOJA', 'loja')
+    NOTIFICACAO_WEBHOOK_URL = os.environ.get('NOTIFICACAO_WEBHOOK_URL')
+    NOTIFICACAO_ARQUIVO = os.environ.get('NOTIFICACAO_ARQUIVO', 'notificacoes.log') # relativo a instance/
+    NOTIFICACAO_LOTE = 50
+    NOTIFICACAO_CONCORRENCIA = 4
+    NOTIFICACAO_MAX_TENTATIVAS = 8
+    NOTIFICACAO_ESPERA_BASE = 5 # segundos; dobra a cada falha
+    NOTIFICACAO_ESPERA_MAXIMA = 3600
+
+    # Limite de tentativas por rota, por IP e por telefone: (tentativas, janela em segundos).
+    # Os contadores ficam em instance/RATE_LIMIT_ARQUIVO e valem para todos os workers.
+    RATE_LIMITS = {
+        'login': {'ip': (20, 300), 'telefone': (5, 300)},
+        'cadastro': {'ip': (5, 600), 'telefone': (3, 3600)},
+    }
+    RATE_LIMIT_ARQUIVO = 'rate_limit.db'
+    # Lojas atendidas por esta instalação (slug -> nome). A loja "principal" usa o
+    # banco padrão; as demais têm um banco próprio em LOJA_BANCO_URI. Outras lojas
+    # podem ser definidas em LOJAS="centro=Pastelaria Centro;norte=Pastelaria Norte".
+    LOJAS = {'principal': 'Pastelaria Delícia'}
+    LOJAS.update(item.split('=', 1) for item in os.environ.get('LOJAS', '').split(';') if '=' in item)
+    LOJA_BANCO_URI = os.environ.get('LOJA_BANCO_URI', 'sqlite:///loja_{}.db') # relativo a instance/
+
+    # Profiler por requisição (ver profiler.py). Modos: "amostragem" ou "cprofile".
+    # Os perfis ficam em instance/profiles e são listados em /admin/profiles.
+    PROFILER_ATIVO = os.environ.get('PROFILER_ATIVO', '').lower() in ('1', 'true', 'sim')
+    PROFILER_AMOSTRAGEM = float(os.environ.get('PROFILER_AMOSTRAGEM', 0.01)) # fração das requisições
+    PROFILER_MODO = os.environ.get('PROFILER_MODO', 'amostragem')
+    PROFILER_INTERVALO = 0.005 # segundos entre amostras no modo "amostragem"
+    PROFILER_MAXIMO = 200 # perfis mantidos em disco
+
+    # Horários de retirada/entrega. O dia é dividido em horários de AGENDA_MINUTOS
+    # minutos e cada um aceita pedidos até a capacidade da cozinha, em unidades de
+    # preparo (Produto.carga_preparo). Faixas com outra capacidade (ex.: almoço)
+    # são cadastradas em /admin/capacidade.
+    AGENDA_MINUTOS = 15
+    AGENDA_ABERTURA = os.environ.get('AGENDA_ABERTURA', '10:00')
+    AGENDA_FECHAMENTO = os.environ.get('AGENDA_FECHAMENTO', '22:00')
+    AGENDA_CAPACIDADE_PADRAO = int(os.environ.get('AGENDA_CAPACIDADE_PADRAO', 40))
+    AGENDA_ANTECEDENCIA = 15 # minutos mínimos entre o pedido e o horário escolhido
+    AGENDA_HORIZONTE = 4 # horas à frente que podem ser escolhidas
+    AGENDA_OPCOES = 6 # horários oferecidos no carrinho
+
+    # Impressão dos tickets da cozinha (ver impressao.py). Destino de cada loja:
+    # "tcp://host:porta" (impressora térmica de rede, ESC/POS) ou "arquivo:caminho"
+    # (relativo a instance/). Por loja: IMPRESSORAS="principal=tcp://192.168.0.50:9100;centro=...".
+    # As lojas sem destino próprio usam IMPRESSORA_PADRAO; vazio (o padrão) desativa a
+    # impressão, para a fila não crescer sem ninguém para imprimir.
+    IMPRESSORAS = dict(item.split('=', 1) for item in os.environ.get('IMPRESSORAS', '').split(';') if '=' in item)
+    IMPRESSORA_PADRAO = os.environ.get('IMPRESSORA_PADRAO', '') # {} = slug da loja, ex.: arquivo:impressora_{}.bin
+    IMPRESSORA_COLUNAS = int(os.environ.get('IMPRESSORA_COLUNAS', 48)) # 48 para bobina de 80mm, 32 para 58mm
+    IMPRESSAO_TIMEOUT = 5 # segundos para conectar/enviar à impressora
+    IMPRESSAO_MAX_TENTATIVAS = 10
+    IMPRESSAO_ESPERA_BASE = 2 # segundos; dobra a cada falha
+    IMPRESSAO_ESPERA_MAXIMA = 120
+
+    # Exclusão de dados (LGPD): pedidos tratados por transação e pausa entre os
+    # lotes, para o job nunca segurar o lock de escrita durante o atendimento
+    LGPD_LOTE = 200
+    LGPD_PAUSA = 0.1 # segundos
+
+    # Acompanhamento do pedido pelo cliente. Os eventos ao vivo são servidos pelo
+    # acompanhamento.py em ACOMPANHAMENTO_URL (o nginx encaminha); sem ele, a página
+    # consulta o estado a cada ACOMPANHAMENTO_CONSULTA segundos.
+    ACOMPANHAMENTO_URL = os.environ.get('ACOMPANHAMENTO_URL', '/acompanhar/eventos')
+    ACOMPANHAMENTO_CONSULTA = 20 # segundos
+    ACOMPANHAMENTO_VALIDADE = 12 * 3600 # segundos de validade do link de eventos
+    ACOMPANHAMENTO_JANELA = 30 # minutos da média do ritmo da cozinha
+    ACOMPANHAMENTO_MINUTOS_NOMINAIS = 10 # peso do ritmo nominal (capacidade do horário)
+    ACOMPANHAMENTO_INTERVALO = 1.0 # segundos entre verificações de mudança no acompanhamento.py
+    ACOMPANHAMENTO_RECALCULO = 30 # segundos entre recálculos das previsões sem mudanças
+    ACOMPANHAMENTO_BATIMENTO = 15 # segundos entre comentários que mantêm a conexão aberta
+
+    # Verificações de saúde (/saude/vivo e /saude/pronto). A prontidão falha se
+    # não terminar em SAUDE_ORCAMENTO segundos. As filas acima do limite só são
+    # informadas: uma impressora fora do ar não deve tirar o site do balanceador.
+    SAUDE_ORCAMENTO = float(os.environ.get('SAUDE_ORCAMENTO', 1.0))
+    SAUDE_FILAS_MAXIMAS = {'notificacao_outbox': 5000, 'ticket_impressao': 200}
+
+    # Quantidade de proxies reversos na frente do app (0 = acesso direto)
+    PROXIES_CONFIAVEIS = int(os.environ.get('PROXIES_CONFIAVEIS', 0))
+
 class DevelopmentConfig(Config):
     """Configuração para desenvolvimento"""
     DEBUG = True
@@ -21,12 +112,14 @@ class ProductionConfig(Config):
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
+    PROXIES_CONFIAVEIS = int(os.environ.get('PROXIES_CONFIAVEIS', 1)) # Nginx do docker-compose
 
 class TestingConfig(Config):
     """Configuração para testes"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    RATE_LIMITS = {}
 
 # Mapeamento de configurações
 config = {
@@ -82,9 +82,9 @@ wait_for_app() {
     print_message "⏳ Aguardando aplicação ficar pronta..." $YELLOW
     sleep 10
     
-    # Tenta fazer uma requisição para verificar se está funcionando
+    # Liveness: o processo responde (o banco ainda pode não estar inicializado)
     for i in {1..30}; do
-        if curl -s http://localhost:5000/ > /dev/null 2>&1; then
+        if curl -sf http://localhost:5000/saude/vivo > /dev/null 2>&1; then
             print_message "✅ Aplicação está respondendo" $GREEN
             return 0
         fi
@@ -101,6 +101,21 @@ init_database() {
     print_message "✅ Banco de dados inicializado" $GREEN
 }
 
+# Função para verificar a prontidão (banco, esquema e filas) depois da inicialização
+wait_for_ready() {
+    for i in {1..15}; do
+        if curl -sf http://localhost:5000/saude/pronto > /dev/null 2>&1; then
+            print_message "✅ Aplicação pronta para receber tráfego" $GREEN
+            return 0
+        fi
+        sleep 2
+    done
+
+    print_message "⚠️  Aplicação não está pronta:" $YELLOW
+    curl -s http://localhost:5000/saude/pronto
+    echo
+}
+
 # Função para mostrar status
 show_status() {
     print_message "\n📊 Status dos containers:" $BLUE
@@ -142,6 +157,7 @@ main() {
     start_containers
     wait_for_app
     init_database
+    wait_for_ready
     
     # Status final
     show_status
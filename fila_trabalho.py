@@ -0,0 +1,62 @@
+"""
+Regras comuns das filas de trabalho em segundo plano (impressão e notificações)
+
+As duas filas guardam o status, o número de tentativas, a próxima tentativa e
+o último erro de cada linha, e são processadas por workers que podem rodar em
+paralelo. Aqui ficam a espera exponencial entre tentativas, a devolução das
+linhas abandonadas por um worker que morreu e a reserva por UPDATE condicional,
+para que a política de novas tentativas seja a mesma nos dois workers.
+
+As chaves de configuração de cada fila seguem um prefixo comum:
+{PREFIXO}_ESPERA_BASE, {PREFIXO}_ESPERA_MAXIMA e {PREFIXO}_MAX_TENTATIVAS.
+"""
+
+import datetime
+import random
+
+
+def calcular_espera(tentativas, base, maxima):
+    """Espera exponencial com jitter: base * 2^(tentativas-1), limitada ao máximo."""
+    espera = min(base * 2 ** (tentativas - 1), maxima)
+    return datetime.timedelta(seconds=espera * random.uniform(0.8, 1.2))
+
+
+def devolver_abandonados(Modelo, em_andamento, prazo, agora):
+    """Volta para "pendente" as linhas presas em `em_andamento` há mais que `prazo`.
+
+    A reserva grava o horário em proxima_tentativa; se o worker morreu no meio
+    do trabalho, a linha fica nesse status até passar o prazo.
+    """
+    Modelo.query.filter(
+        Modelo.status == em_andamento,
+        Modelo.proxima_tentativa < agora - prazo,
+    ).update({Modelo.status: 'pendente'}, synchronize_session=False)
+
+
+def reservar(Modelo, item_id, em_andamento, agora):
+    """Passa a linha de "pendente" para `em_andamento`; retorna True se este worker a pegou.
+
+    É um UPDATE condicional, então dois workers nunca reservam a mesma linha.
+    """
+    return Modelo.query.filter_by(id=item_id, status='pendente').update(
+        {Modelo.status: em_andamento, Modelo.proxima_tentativa: agora},
+        synchronize_session=False) == 1
+
+
+def registrar_tentativa(item, erro, config, prefixo, concluido, esgotado, agora):
+    """Registra o resultado de uma tentativa (erro None = sucesso).
+
+    Em caso de falha a linha volta para a fila com espera exponencial ou, depois
+    de {prefixo}_MAX_TENTATIVAS, vai para o status `esgotado`. O chamador grava
+    o horário de conclusão, que tem nome diferente em cada fila.
+    """
+    item.tentativas += 1
+    item.ultimo_erro = erro
+    if erro is None:
+        item.status = concluido
+    elif item.tentativas >= config[f'{prefixo}_MAX_TENTATIVAS']:
+        item.status = esgotado
+    else:
+        item.status = 'pendente'
+        item.proxima_tentativa = agora + calcular_espera(
+            item.tentativas, config[f'{prefixo}_ESPERA_BASE'], config[f'{prefixo}_ESPERA_MAXIMA'])
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Gerador de dados sintéticos para a Pastelaria Web
+
+Cria clientes, produtos e pedidos em grande volume para reproduzir localmente
+a lentidão de produção. Os dados seguem distribuições realistas (picos no
+almoço e no jantar, fins de semana mais movimentados e poucos produtos
+concentrando a maior parte das vendas) e são determinísticos para uma mesma
+semente (e a mesma data final, --ate).
+
+Os clientes vão para o banco padrão; cada loja de LOJAS recebe o cardápio e
+--pedidos pedidos no seu próprio banco. Os pedidos seguem o esquema atual:
+horário de retirada, carga de preparo, ids em ordem de chegada, e o quadro
+da cozinha, a fila de preparo e a ocupação dos horários de hoje são
+preenchidos no final.
+
+Uso:
+    python gerar_dados.py --clientes 20000 --produtos 40 --pedidos 1000000 --seed 42
+
+Os registros são gravados com executemany em uma única transação grande por
+banco, diretamente no arquivo SQLite, e os índices secundários só são
+recriados no final da carga.
+"""
+
+import argparse
+import collections
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import time
+
+# Catálogo base usado para montar os nomes dos produtos
+SABORES = {
+    'Pastel Salgado': [
+        ('Carne', 8.50), ('Queijo', 8.00), ('Frango com Catupiry', 9.00), ('Pizza', 8.50),
+        ('Palmito', 9.50), ('Calabresa', 8.50), ('Bauru', 9.00), ('Carne Seca', 10.50),
+        ('Camarão', 12.00), ('Bacalhau', 12.50), ('Escarola', 8.00), ('Milho', 7.50),
+    ],
+    'Pastel Doce': [
+        ('Chocolate', 7.50), ('Banana com Canela', 7.00), ('Doce de Leite', 7.50),
+        ('Romeu e Julieta', 8.00), ('Prestígio', 8.00), ('Nutella', 10.00),
+    ],
+    'Bebida': [
+        ('Refrigerante Lata', 5.00), ('Suco Natural de Laranja', 6.00), ('Café', 3.50),
+        ('Água', 2.50), ('Caldo de Cana', 6.50), ('Chá Gelado', 5.50),
+    ],
+}
+# Participação de cada categoria no catálogo gerado
+PESO_CATEGORIA = {'Pastel Salgado': 0.55, 'Pastel Doce': 0.2, 'Bebida': 0.25}
+# Itens que saem prontos, sem trabalho de cozinha (carga_preparo 0)
+PRONTOS = {'Refrigerante Lata', 'Água', 'Chá Gelado'}
+
+NOMES = ['Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique',
+         'Isabela', 'João', 'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael',
+         'Sabrina', 'Thiago', 'Vanessa', 'William']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa',
+              'Ferreira', 'Almeida', 'Ribeiro', 'Carvalho', 'Gomes']
+RUAS = ['Rua das Flores', 'Av. Brasil', 'Rua XV de Novembro', 'Rua Sete de Setembro',
+        'Av. Paulista', 'Rua da Praia', 'Rua Amazonas', 'Rua Paraná']
+
+# Movimento relativo por dia da semana (segunda=0 ... domingo=6)
+PESO_DIA_SEMANA = [0.8, 0.8, 0.9, 0.95, 1.2, 1.5, 1.35]
+
+# Senha "123456" de todos os clientes gerados. O hash é calculado uma única vez:
+# gerar um hash por cliente levaria minutos.
+SENHA_PADRAO = '123456'
+
+TAMANHO_LOTE = 50000
+
+# Tabelas de cada loja, na ordem em que podem ser apagadas (dependentes primeiro)
+TABELAS_LOJA = ['ticket_impressao', 'notificacao_outbox', 'ocupacao_horario', 'fila_preparo',
+                'producao_pendente', 'itens_pedido', 'pedido', 'produto']
+TABELAS_GLOBAIS = ['solicitacao_lgpd', 'cliente']
+
+FORMATO_DATA = '%Y-%m-%d %H:%M'
+
+
+def peso_minuto(minuto):
+    """Movimento relativo de um minuto do dia: picos no almoço e no jantar."""
+    hora = minuto / 60.0
+    if hora < 10 or hora >= 23:
+        return 0.0
+    almoco = 3.0 * 2.718 ** (-((hora - 12.3) ** 2) / 0.8)
+    jantar = 2.2 * 2.718 ** (-((hora - 19.5) ** 2) / 1.5)
+    return 0.15 + almoco + jantar
+
+
+def acumular(pesos):
+    """Transforma uma lista de pesos em pesos acumulados (para random.choices)."""
+    total = 0.0
+    acumulados = []
+    for peso in pesos:
+        total += peso
+        acumulados.append(total)
+    return acumulados
+
+
+def montar_produtos(quantidade, rng):
+    """Gera (nome, descricao, preco, categoria, carga_preparo) com nomes únicos."""
+    produtos = []
+    categorias = list(PESO_CATEGORIA)
+    contagem = {categoria: 0 for categoria in categorias}
+    for i in range(quantidade):
+        categoria = rng.choices(categorias, weights=[PESO_CATEGORIA[c] for c in categorias])[0]
+        sabores = SABORES[categoria]
+        indice = contagem[categoria]
+        contagem[categoria] += 1
+        sabor, preco = sabores[indice % len(sabores)]
+        rodada = indice // len(sabores)
+        if categoria == 'Bebida':
+            nome = sabor if rodada == 0 else f'{sabor} {rodada + 1}'
+        else:
+            nome = f'Pastel de {sabor}' if rodada == 0 else f'Pastel de {sabor} {rodada + 1}'
+        preco = round(preco + rodada * 0.5, 2)
+        produtos.append((nome, f'{sabor} (gerado)', preco, categoria, 0 if sabor in PRONTOS else 1))
+    return produtos
+
+
+def montar_clientes(quantidade, rng, senha_hash, data_inicial):
+    """Gera as linhas da tabela cliente."""
+    linhas = []
+    for i in range(quantidade):
+        nome = f'{rng.choice(NOMES)} {rng.choice(SOBRENOMES)}'
+        telefone = f'119{i:08d}'
+        endereco = f'{rng.choice(RUAS)}, {rng.randint(1, 2000)}'
+        cadastro = data_inicial + datetime.timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+        linhas.append((i + 1, nome, telefone, endereco, senha_hash, 0, 1,
+                       cadastro.strftime('%Y-%m-%d %H:%M:%S.000000')))
+    return linhas
+
+
+def gerar_pedidos(args, rng, produtos, conexao, agenda):
+    """Gera pedidos e itens em ordem de chegada e grava cada lote com executemany.
+
+    Os minutos sorteados são hora local da loja; data_pedido é gravada em UTC,
+    como no checkout, e o horário de retirada segue a antecedência e o passo da
+    agenda (`agenda`: fuso, antecedencia e passo, em horas e minutos).
+    """
+    hoje = args.ate
+    dias = [hoje - datetime.timedelta(days=d) for d in range(args.dias - 1, -1, -1)]
+    pesos_dias = acumular([PESO_DIA_SEMANA[dia.weekday()] for dia in dias])
+    indice_hoje = len(dias) - 1
+    pedidos_por_dia = collections.Counter(rng.choices(range(len(dias)), cum_weights=pesos_dias, k=args.pedidos))
+
+    minutos = list(range(24 * 60))
+    pesos_minutos = acumular([peso_minuto(m) for m in minutos])
+    fuso = datetime.timedelta(hours=agenda['fuso'])
+    passo = agenda['passo']
+
+    # Popularidade dos produtos segue uma lei de Zipf (poucos campeões de venda)
+    ids_produtos = list(range(1, len(produtos) + 1))
+    ordem = ids_produtos[:]
+    rng.shuffle(ordem)
+    popularidade = {produto_id: 1.0 / (posicao + 1) ** 1.1 for posicao, produto_id in enumerate(ordem)}
+    pesos_produtos = acumular([popularidade[p] for p in ids_produtos])
+    precos = [produto[2] for produto in produtos]
+    cargas = [produto[4] for produto in produtos]
+
+    # Quantidade de produtos diferentes por pedido e de unidades por item
+    linhas_por_pedido = [1, 2, 3, 4, 5]
+    pesos_linhas = acumular([0.35, 0.35, 0.18, 0.08, 0.04])
+    unidades = [1, 2, 3, 4]
+    pesos_unidades = acumular([0.7, 0.2, 0.07, 0.03])
+
+    status_hoje = ['Recebido', 'Em Preparo', 'Pronto para Entrega', 'Entregue']
+    choices = rng.choices
+    randrange = rng.randrange
+    random_ = rng.random
+
+    # Retirada na loja: as lojas geradas não têm zonas de entrega
+    sql_pedido = ('INSERT INTO pedido (id, cliente_id, data_pedido, valor_total, status, horario, carga_preparo, '
+                  'entrega) VALUES (?, ?, ?, ?, ?, ?, ?, 0)')
+    sql_item = 'INSERT INTO itens_pedido (pedido_id, produto_id, quantidade) VALUES (?, ?, ?)'
+
+    pedido_id = 0
+    total_itens = 0
+    pedidos = []
+    itens = []
+
+    def gravar():
+        """Grava os pedidos e itens acumulados; retorna a quantidade de itens."""
+        conexao.executemany(sql_pedido, pedidos)
+        conexao.executemany(sql_item, itens)
+        gravados = len(itens)
+        pedidos.clear()
+        itens.clear()
+        print(f'   ... {pedido_id} pedidos gerados', end='\r')
+        return gravados
+
+    for dia_indice, dia in enumerate(dias):
+        quantidade_dia = pedidos_por_dia[dia_indice]
+        if not quantidade_dia:
+            continue
+        meia_noite = datetime.datetime.combine(dia, datetime.time())
+        minutos_dia = sorted(choices(minutos, cum_weights=pesos_minutos, k=quantidade_dia))
+        linhas_dia = choices(linhas_por_pedido, cum_weights=pesos_linhas, k=quantidade_dia)
+        produtos_dia = choices(ids_produtos, cum_weights=pesos_produtos, k=sum(linhas_dia))
+        unidades_dia = choices(unidades, cum_weights=pesos_unidades, k=len(produtos_dia))
+        # Textos de data e de horário calculados uma vez por minuto do dia
+        datas_texto = {m: (meia_noite + datetime.timedelta(minutes=m) - fuso).strftime(FORMATO_DATA)
+                       for m in set(minutos_dia)}
+        horarios_texto = {}
+
+        cursor_produto = 0
+        for i in range(quantidade_dia):
+            pedido_id += 1
+            quantidade_linhas = linhas_dia[i]
+            escolhidos = {}
+            for j in range(cursor_produto, cursor_produto + quantidade_linhas):
+                produto_id = produtos_dia[j]
+                if produto_id not in escolhidos:
+                    escolhidos[produto_id] = unidades_dia[j]
+            cursor_produto += quantidade_linhas
+
+            valor_total = 0.0
+            carga = 0
+            for produto_id, quantidade in escolhidos.items():
+                valor_total += precos[produto_id - 1] * quantidade
+                carga += cargas[produto_id - 1] * quantidade
+                itens.append((pedido_id, produto_id, quantidade))
+
+            if dia_indice == indice_hoje:
+                status = status_hoje[randrange(4)]
+            else:
+                status = 'Cancelado' if random_() < 0.03 else 'Entregue'
+            minuto = minutos_dia[i]
+            segundo = randrange(60)
+            # Primeiro horário depois da antecedência, como em janela_horarios()
+            inicio = -(-(minuto + agenda['antecedencia'] + (1 if segundo else 0)) // passo) * passo
+            horario = horarios_texto.get(inicio)
+            if horario is None:
+                horario = horarios_texto[inicio] = \
+                    (meia_noite + datetime.timedelta(minutes=inicio)).strftime(FORMATO_DATA) + ':00.000000'
+            data = f'{datas_texto[minuto]}:{segundo:02d}.000000'
+            pedidos.append((pedido_id, randrange(args.clientes) + 1, data, round(valor_total, 2), status,
+                            horario, carga))
+
+        if len(pedidos) >= TAMANHO_LOTE:
+            total_itens += gravar()
+    if pedidos:
+        total_itens += gravar()
+
+    print()
+    return total_itens
+
+
+def adiar_indices(conexao, tabelas):
+    """Remove os índices secundários das tabelas e devolve o SQL para recriá-los."""
+    marcadores = ','.join('?' for _ in tabelas)
+    indices = conexao.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+        f"AND tbl_name IN ({marcadores})", tabelas).fetchall()
+    for nome, _ in indices:
+        conexao.execute(f'DROP INDEX "{nome}"')
+    return [sql for _, sql in indices]
+
+
+def preencher_estado_loja(loja):
+    """Quadro da cozinha, fila de preparo e ocupação dos horários de hoje, pelas funções do app."""
+    from app import (db, contexto_loja, recalcular_producao, recalcular_fila, agora_loja,
+                     capacidade_do_horario, Pedido, OcupacaoHorario)
+
+    with contexto_loja(loja):
+        recalcular_producao()
+        recalcular_fila()
+        hoje = datetime.datetime.combine(agora_loja().date(), datetime.time())
+        reservas = db.session.query(Pedido.horario, db.func.sum(Pedido.carga_preparo)) \
+            .filter(Pedido.horario >= hoje, Pedido.status != 'Cancelado').group_by(Pedido.horario)
+        # Horários com mais pedidos gerados do que a capacidade ficam lotados
+        for inicio, reservado in reservas:
+            db.session.add(OcupacaoHorario(inicio=inicio, capacidade=capacidade_do_horario(inicio),
+                                           reservado=reservado))
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera dados sintéticos em grande volume.')
+    parser.add_argument('--clientes', type=int, default=10000, help='quantidade de clientes (padrão: 10000)')
+    parser.add_argument('--produtos', type=int, default=30, help='quantidade de produtos por loja (padrão: 30)')
+    parser.add_argument('--pedidos', type=int, default=1000000, help='quantidade de pedidos por loja (padrão: 1000000)')
+    parser.add_argument('--dias', type=int, default=365, help='período coberto, em dias até hoje (padrão: 365)')
+    parser.add_argument('--ate', type=datetime.date.fromisoformat, default=datetime.date.today(),
+                        help='último dia do período, AAAA-MM-DD (padrão: hoje)')
+    parser.add_argument('--seed', type=int, default=42, help='semente do gerador aleatório (padrão: 42)')
+    parser.add_argument('--banco', help='arquivo SQLite do banco padrão (padrão: o banco configurado no app; '
+                                        'as demais lojas usam LOJA_BANCO_URI)')
+    parser.add_argument('--limpar', action='store_true', help='apaga os dados existentes antes de gerar')
+    args = parser.parse_args()
+
+    if args.clientes < 1 or args.produtos < 1 or args.pedidos < 0 or args.dias < 1:
+        parser.error('clientes, produtos e dias devem ser positivos.')
+
+    # Define o banco antes de importar o app (mesmo esquema do init_simple.py)
+    if args.banco:
+        os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.banco)}'
+
+    from app import app, criar_tabelas, engine_loja, LOJA_PADRAO
+    from werkzeug.security import generate_password_hash
+
+    lojas = list(app.config['LOJAS'])
+    with app.app_context():
+        engines = {loja: engine_loja(loja) for loja in lojas}
+        if any(engine.url.get_backend_name() != 'sqlite' for engine in engines.values()):
+            print('❌ O gerador grava direto nos arquivos e só funciona com SQLite.')
+            sys.exit(1)
+        criar_tabelas()
+        caminhos = {loja: engine.url.database for loja, engine in engines.items()}
+        for engine in engines.values():
+            engine.dispose()
+    agenda = {'fuso': app.config['ANALYTICS_FUSO_HORARIO'], 'antecedencia': app.config['AGENDA_ANTECEDENCIA'],
+              'passo': app.config['AGENDA_MINUTOS']}
+
+    conexoes = {}
+    for loja, caminho in caminhos.items():
+        conexao = sqlite3.connect(caminho, isolation_level=None)
+        conexao.execute('PRAGMA journal_mode = MEMORY')
+        conexao.execute('PRAGMA synchronous = OFF')
+        conexao.execute('PRAGMA cache_size = -200000')
+        conexoes[loja] = conexao
+
+    existentes = sum(conexao.execute('SELECT (SELECT COUNT(*) FROM produto) + (SELECT COUNT(*) FROM pedido)')
+                     .fetchone()[0] for conexao in conexoes.values())
+    existentes += conexoes[LOJA_PADRAO].execute('SELECT COUNT(*) FROM cliente').fetchone()[0]
+    if existentes and not args.limpar:
+        print('⚠️  O banco já possui dados. Use --limpar para substituí-los.')
+        sys.exit(1)
+
+    inicio = time.perf_counter()
+    senha_hash = generate_password_hash(SENHA_PADRAO)
+    data_inicial = datetime.datetime.combine(args.ate - datetime.timedelta(days=args.dias + 30), datetime.time())
+    try:
+        for loja, conexao in conexoes.items():
+            print(f'🏪 Loja {loja}')
+            # Cada loja com sua própria sequência, a principal com a semente pura
+            rng = random.Random(args.seed if loja == LOJA_PADRAO else f'{args.seed}:{loja}')
+            tabelas = TABELAS_LOJA + (TABELAS_GLOBAIS if loja == LOJA_PADRAO else [])
+            conexao.execute('BEGIN')
+            if args.limpar:
+                for tabela in tabelas:
+                    conexao.execute(f'DELETE FROM {tabela}')
+
+            recriar = adiar_indices(conexao, tabelas)
+
+            produtos = montar_produtos(args.produtos, rng)
+            conexao.executemany('INSERT INTO produto (id, nome, descricao, preco, categoria, carga_preparo) '
+                                'VALUES (?, ?, ?, ?, ?, ?)', [(i + 1,) + produto for i, produto in enumerate(produtos)])
+            print(f'✅ {len(produtos)} produtos')
+
+            if loja == LOJA_PADRAO:
+                clientes = montar_clientes(args.clientes, rng, senha_hash, data_inicial)
+                conexao.executemany('INSERT INTO cliente (id, nome, telefone, endereco, senha_hash, is_admin, '
+                                    'consentimento_lgpd, data_cadastro) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', clientes)
+                print(f'✅ {len(clientes)} clientes (senha: {SENHA_PADRAO})')
+
+            total_itens = gerar_pedidos(args, rng, produtos, conexao, agenda)
+            print(f'✅ {args.pedidos} pedidos com {total_itens} itens')
+
+            # Invalida os caches do cardápio, das promoções, da agenda e dos relatórios
+            for nome in ('pedidos', 'cardapio', 'promocoes', 'capacidade'):
+                conexao.execute("INSERT INTO versao_dados (nome, valor) VALUES (?, 1) "
+                                "ON CONFLICT(nome) DO UPDATE SET valor = valor + 1", (nome,))
+
+            for sql in recriar:
+                conexao.execute(sql)
+            conexao.execute('COMMIT')
+            conexao.execute('ANALYZE')
+    except BaseException:
+        for conexao in conexoes.values():
+            if conexao.in_transaction:
+                conexao.execute('ROLLBACK')
+        raise
+    finally:
+        for conexao in conexoes.values():
+            conexao.close()
+
+    for loja in lojas:
+        preencher_estado_loja(loja)
+    print('✅ Quadro da cozinha, fila de preparo e ocupação dos horários de hoje')
+
+    print(f'\n🎉 Dados gerados em {time.perf_counter() - inicio:.1f}s nos arquivos {", ".join(caminhos.values())}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Configuração do Gunicorn da Pastelaria Web
+
+Desligamento com drenagem: no primeiro SIGTERM (docker stop, deploy) o
+servidor cria o arquivo instance/drenando-<host>, que faz /saude/pronto
+responder 503, e continua atendendo normalmente por SAUDE_DRENAGEM segundos
+para o balanceador tirar a instância de rotação. Depois segue o desligamento
+gracioso do próprio Gunicorn: para de aceitar conexões e espera as requisições
+em andamento (ex.: um checkout) terminarem, por até graceful_timeout segundos.
+Um segundo SIGTERM durante a drenagem desliga na hora (de forma graciosa).
+
+O docker-compose usa stop_grace_period maior que SAUDE_DRENAGEM + graceful_timeout.
+"""
+
+import os
+import signal
+import socket
+import threading
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+DRENAGEM = float(os.environ.get('SAUDE_DRENAGEM', 10))
+# Mesmo caminho de ARQUIVO_DRENAGEM no app.py
+ARQUIVO_DRENAGEM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance',
+                                f'drenando-{socket.gethostname()}')
+
+
+def _remover_marcador():
+    try:
+        os.remove(ARQUIVO_DRENAGEM)
+    except FileNotFoundError:
+        pass
+
+
+def when_ready(server):
+    """Troca o tratamento do SIGTERM do processo mestre pela drenagem."""
+    _remover_marcador()
+    desligamento_gracioso = server.handle_term
+    drenando = threading.Event()
+
+    def handle_term():
+        if drenando.is_set() or DRENAGEM <= 0:
+            return desligamento_gracioso()
+        drenando.set()
+        os.makedirs(os.path.dirname(ARQUIVO_DRENAGEM), exist_ok=True)
+        open(ARQUIVO_DRENAGEM, 'w').close()
+        server.log.info('Drenando por %ss antes de desligar', DRENAGEM)
+        # O fim da drenagem reenvia o SIGTERM, agora tratado pelo Gunicorn
+        temporizador = threading.Timer(DRENAGEM, os.kill, (os.getpid(), signal.SIGTERM))
+        temporizador.daemon = True
+        temporizador.start()
+
+    server.handle_term = handle_term
+
+
+def on_exit(server):
+    _remover_marcador()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Impressão dos tickets da cozinha da Pastelaria Web
+
+O checkout só grava o ticket na tabela ticket_impressao (na mesma transação do
+pedido); este processo lê a fila de cada loja em ordem, monta o ticket em
+ESC/POS e o envia para a impressora térmica da loja. Se a impressora falhar, o
+mesmo ticket é tentado de novo com espera exponencial (os seguintes aguardam,
+para não saírem fora de ordem); depois de IMPRESSAO_MAX_TENTATIVAS ele vai
+para o status "erro" e pode ser reimpresso pelo admin.
+
+Uso:
+    python impressao.py            # roda continuamente
+    python impressao.py --uma-vez  # esvazia as filas e termina
+
+Destinos: "tcp://host:porta" ou "arquivo:caminho". Outros tipos de destino são
+registrados com o decorator @destino('esquema'). Para testar sem impressora,
+use o impressora_local.py como destino TCP.
+"""
+
+import argparse
+import datetime
+import fcntl
+import json
+import os
+import socket
+import textwrap
+import time
+
+import fila_trabalho
+
+# Registro de destinos: esquema -> função enviar(endereco, dados, config)
+DESTINOS = {}
+
+# Tickets "imprimindo" há mais tempo que isso voltam para a fila
+PRAZO_IMPRESSAO = datetime.timedelta(minutes=2)
+
+# Comandos ESC/POS usados no ticket
+ESC_INICIAR = b'\x1b@'
+ESC_PAGINA_PORTUGUES = b'\x1bt\x03' # tabela de caracteres CP860
+ESC_ESQUERDA = b'\x1ba\x00'
+ESC_CENTRO = b'\x1ba\x01'
+ESC_NEGRITO = b'\x1bE\x01'
+ESC_SEM_NEGRITO = b'\x1bE\x00'
+GS_TAMANHO_DUPLO = b'\x1d!\x11'
+GS_TAMANHO_NORMAL = b'\x1d!\x00'
+GS_AVANCAR_E_CORTAR = b'\x1dV\x42\x04' # avança 4 linhas e faz corte parcial
+
+
+def destino(esquema):
+    """Decorator que registra uma função de envio para um tipo de destino."""
+    def registrar(funcao):
+        DESTINOS[esquema] = funcao
+        return funcao
+    return registrar
+
+
+@destino('tcp')
+def enviar_tcp(endereco, dados, config):
+    """Envia os bytes para uma impressora de rede (porta RAW, normalmente 9100)."""
+    host, _, porta = endereco.lstrip('/').rpartition(':')
+    with socket.create_connection((host, int(porta)), timeout=config['IMPRESSAO_TIMEOUT']) as conexao:
+        conexao.sendall(dados)
+
+
+def caminho_do_arquivo(endereco, config):
+    """Caminho de um destino "arquivo:" (os relativos ficam em instance/)."""
+    return endereco if os.path.isabs(endereco) else os.path.join(config['INSTANCE_PATH'], endereco)
+
+
+@destino('arquivo')
+def enviar_arquivo(endereco, dados, config):
+    """Acrescenta os bytes ao arquivo (ex.: /dev/usb/lp0 ou um arquivo de testes)."""
+    with open(caminho_do_arquivo(endereco, config), 'ab') as arquivo:
+        # A mesma trava do job de exclusão de dados (LGPD), que reescreve o arquivo
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        arquivo.write(dados)
+
+
+def destino_da_loja(loja, config):
+    """Destino da impressora da loja ('' quando a impressão está desativada)."""
+    return config['IMPRESSORAS'].get(loja) or config['IMPRESSORA_PADRAO'].format(loja)
+
+
+# --- RENDERIZAÇÃO ---
+
+def _linhas(texto, largura, recuo=''):
+    return textwrap.wrap(texto, largura, subsequent_indent=recuo) or ['']
+
+
+def renderizar_ticket(dados, reimpressao, colunas):
+    """Monta o ticket da cozinha em ESC/POS a partir dos dados gravados na fila.
+
+    `dados`: {'loja', 'pedido_id', 'data', 'horario', 'cliente', 'telefone',
+    'endereco', 'itens': [{'nome', 'quantidade'}], 'valor_total'}.
+    """
+    saida = []
+
+    def escrever(*partes):
+        saida.extend(partes)
+
+    def linha(texto=''):
+        escrever(texto.encode('cp860', errors='replace') + b'\n')
+
+    separador = '-' * colunas
+    escrever(ESC_INICIAR, ESC_PAGINA_PORTUGUES, ESC_CENTRO, ESC_NEGRITO)
+    linha(dados['loja'])
+    escrever(ESC_SEM_NEGRITO)
+    if reimpressao:
+        linha('*** REIMPRESSÃO ***')
+    # Em tamanho duplo cabem metade das colunas
+    escrever(GS_TAMANHO_DUPLO)
+    linha(f"PEDIDO #{dados['pedido_id']}")
+    if dados.get('horario'):
+        linha(f"RETIRADA {dados['horario']}")
+    escrever(GS_TAMANHO_NORMAL, ESC_ESQUERDA)
+    linha(dados['data'])
+    for texto in _linhas(f"Cliente: {dados['cliente']} ({dados['telefone']})", colunas, '  '):
+        linha(texto)
+    for texto in _linhas(f"Endereço: {dados['endereco']}", colunas, '  '):
+        linha(texto)
+    linha(separador)
+    escrever(ESC_NEGRITO, GS_TAMANHO_DUPLO)
+    for item in dados['itens']:
+        for texto in _linhas(f"{item['quantidade']}x {item['nome']}", colunas // 2, '   '):
+            linha(texto)
+    escrever(GS_TAMANHO_NORMAL, ESC_SEM_NEGRITO)
+    linha(separador)
+    total = f"Total: R$ {dados['valor_total']:.2f}".replace('.', ',')
+    linha(total.rjust(colunas))
+    escrever(GS_AVANCAR_E_CORTAR)
+    return b''.join(saida)
+
+
+# --- FILA ---
+
+def calcular_espera(tentativas, config):
+    """Espera antes da próxima tentativa (política comum em fila_trabalho)."""
+    return fila_trabalho.calcular_espera(tentativas, config['IMPRESSAO_ESPERA_BASE'],
+                                         config['IMPRESSAO_ESPERA_MAXIMA'])
+
+
+def reservar_proximo(db, TicketImpressao):
+    """Marca como "imprimindo" o ticket mais antigo da fila, se ele já puder ser tentado.
+
+    Os tickets saem estritamente em ordem: enquanto o primeiro aguarda uma nova
+    tentativa, os demais também aguardam.
+    """
+    agora = datetime.datetime.utcnow()
+    fila_trabalho.devolver_abandonados(TicketImpressao, 'imprimindo', PRAZO_IMPRESSAO, agora)
+
+    primeiro = db.session.query(TicketImpressao.id, TicketImpressao.proxima_tentativa) \
+        .filter(TicketImpressao.status == 'pendente').order_by(TicketImpressao.id).first()
+    reservado = False
+    if primeiro is not None and primeiro.proxima_tentativa <= agora:
+        reservado = fila_trabalho.reservar(TicketImpressao, primeiro.id, 'imprimindo', agora)
+    db.session.commit()
+    return db.session.get(TicketImpressao, primeiro.id) if reservado else None
+
+
+def enviar(endereco_destino, dados, config):
+    """Envia os bytes para o destino; retorna None ou a mensagem de erro."""
+    esquema, _, endereco = endereco_destino.partition(':')
+    funcao = DESTINOS.get(esquema)
+    if funcao is None:
+        return f'destino desconhecido: {esquema}'
+    try:
+        funcao(endereco, dados, config)
+        return None
+    except Exception as e:
+        return f'{type(e).__name__}: {e}'[:500]
+
+
+def imprimir_proximo(db, TicketImpressao, endereco_destino, config):
+    """Imprime o próximo ticket da fila da loja atual. Retorna True se imprimiu."""
+    ticket = reservar_proximo(db, TicketImpressao)
+    if ticket is None:
+        return False
+    dados = renderizar_ticket(json.loads(ticket.dados), ticket.reimpressao, config['IMPRESSORA_COLUNAS'])
+    erro = enviar(endereco_destino, dados, config)
+
+    agora = datetime.datetime.utcnow()
+    fila_trabalho.registrar_tentativa(ticket, erro, config, 'IMPRESSAO', 'impresso', 'erro', agora)
+    if erro is None:
+        ticket.impresso_em = agora
+    db.session.commit()
+    return erro is None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Imprime os tickets da cozinha que estão na fila.')
+    parser.add_argument('--uma-vez', action='store_true', help='esvazia as filas uma vez e termina')
+    parser.add_argument('--intervalo', type=float, default=1.0,
+                        help='segundos entre consultas quando as filas estão vazias (padrão: 1)')
+    args = parser.parse_args()
+
+    from app import app, db, TicketImpressao, contexto_loja, criar_tabelas
+
+    config = dict(app.config, INSTANCE_PATH=app.instance_path)
+    with app.app_context():
+        criar_tabelas()
+    destinos = {loja: destino_da_loja(loja, config) for loja in config['LOJAS']}
+    print('🖨️  Impressão de tickets iniciada')
+    for loja, endereco_destino in destinos.items():
+        print(f'   {loja}: {endereco_destino or "desativada"}')
+    while True:
+        impressos = 0
+        for loja, endereco_destino in destinos.items():
+            if not endereco_destino:
+                continue
+            with contexto_loja(loja):
+                while imprimir_proximo(db, TicketImpressao, endereco_destino, config):
+                    impressos += 1
+        if impressos:
+            print(f'   ... {impressos} tickets impressos')
+            continue
+        if args.uma_vez:
+            break
+        time.sleep(args.intervalo)
+
+if __name__ == '__main__':
+    main()
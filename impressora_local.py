@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Impressora térmica de mentira para desenvolvimento e testes
+
+Escuta em uma porta TCP como uma impressora de rede (RAW/9100), recebe os
+tickets ESC/POS enviados pelo impressao.py e mostra no terminal o texto que
+sairia no papel. Opcionalmente grava cada ticket recebido em um arquivo .bin.
+
+Uso:
+    python impressora_local.py                    # escuta em 127.0.0.1:9100
+    python impressora_local.py --porta 9101 --pasta /tmp/tickets
+
+e configure a loja com IMPRESSORAS="principal=tcp://127.0.0.1:9100".
+"""
+
+import argparse
+import os
+import re
+import socketserver
+
+# Comandos ESC/POS (com seus parâmetros) removidos para exibir só o texto
+_COMANDOS = re.compile(rb'\x1b@|\x1b[taE!].|\x1d!.|\x1dV[AB].|\x1dV[\x00\x01\x30\x31]', re.DOTALL)
+
+
+def texto_do_ticket(dados):
+    """Texto legível de um ticket ESC/POS (sem os comandos de formatação)."""
+    return _COMANDOS.sub(b'', dados).decode('cp860', errors='replace')
+
+
+class _Receptor(socketserver.StreamRequestHandler):
+    def handle(self):
+        dados = self.rfile.read()
+        self.server.tickets.append(dados)
+        if self.server.pasta:
+            os.makedirs(self.server.pasta, exist_ok=True)
+            caminho = os.path.join(self.server.pasta, f'ticket_{len(self.server.tickets):05d}.bin')
+            with open(caminho, 'wb') as arquivo:
+                arquivo.write(dados)
+        if self.server.mostrar:
+            print(texto_do_ticket(dados))
+            print('=' * 48, flush=True)
+
+
+class ImpressoraLocal(socketserver.ThreadingTCPServer):
+    """Servidor TCP que guarda, em `tickets`, os bytes de cada conexão recebida."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, endereco, pasta=None, mostrar=True):
+        super().__init__(endereco, _Receptor)
+        self.tickets = []
+        self.pasta = pasta
+        self.mostrar = mostrar
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simula uma impressora térmica de rede (ESC/POS).')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=9100)
+    parser.add_argument('--pasta', help='grava cada ticket recebido nesta pasta')
+    args = parser.parse_args()
+
+    with ImpressoraLocal((args.host, args.porta), pasta=args.pasta) as servidor:
+        print(f'🖨️  Impressora local escutando em {args.host}:{args.porta}')
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    main()
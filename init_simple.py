@@ -6,17 +6,18 @@ Script simples para inicializar o banco de dados
 import os
 import sys
 
-# Define a variável de ambiente antes de importar o app
-os.environ['DATABASE_URL'] = 'sqlite:////tmp/pastelaria.db'
+# Define a variável de ambiente antes de importar o app (se o ambiente ainda não definiu,
+# ex.: o docker-compose aponta para o banco no volume instance/)
+os.environ.setdefault('DATABASE_URL', 'sqlite:////tmp/pastelaria.db')
 
-from app import app, db, Cliente, Produto, Pedido
+from app import app, db, Cliente, Produto, Pedido, criar_tabelas
 from werkzeug.security import generate_password_hash
 
 def init_database():
     """Inicializa o banco de dados e cria dados de exemplo"""
     with app.app_context():
         # Cria todas as tabelas
-        db.create_all()
+        criar_tabelas() # também adiciona as colunas novas a um banco antigo
         print("✅ Tabelas do banco de dados criadas com sucesso!")
         
         # Verifica se já existem dados
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Job de exclusão de dados (LGPD) da Pastelaria Web
+
+O pedido de exclusão feito em /meus_dados anonimiza o cadastro na hora e grava
+uma solicitação em solicitacao_lgpd. Este processo trata as solicitações: em
+cada loja, remove os dados pessoais copiados para os tickets de impressão e
+para as notificações dos pedidos do cliente (nas tabelas, no arquivo do canal
+'arquivo' e no arquivo da impressora com destino "arquivo:"), em lotes
+pequenos (LGPD_LOTE), um lote por transação. O progresso é gravado a cada lote, então um job
+interrompido é retomado de onde parou.
+
+Uso:
+    python lgpd.py            # roda continuamente
+    python lgpd.py --uma-vez  # trata as solicitações pendentes e termina
+"""
+
+import argparse
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Trata as solicitações de exclusão de dados (LGPD).')
+    parser.add_argument('--uma-vez', action='store_true', help='trata as solicitações pendentes e termina')
+    parser.add_argument('--intervalo', type=float, default=30.0,
+                        help='segundos entre consultas quando não há solicitações (padrão: 30)')
+    args = parser.parse_args()
+
+    from app import app, criar_tabelas, reservar_solicitacao_lgpd, executar_solicitacao_lgpd
+
+    with app.app_context():
+        criar_tabelas()
+    print('🔒 Job de exclusão de dados (LGPD) iniciado')
+    while True:
+        with app.app_context():
+            solicitacao = reservar_solicitacao_lgpd()
+            if solicitacao is not None:
+                executar_solicitacao_lgpd(solicitacao)
+                print(f'   ... solicitação #{solicitacao.id}: {solicitacao.pedidos_tratados} pedidos tratados')
+                continue
+        if args.uma_vez:
+            break
+        time.sleep(args.intervalo)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Despachante de notificações da Pastelaria Web
+
+Lê a tabela notificacao_outbox (preenchida pelo checkout na mesma transação do
+pedido) e envia as mensagens pelos canais configurados, em lotes e com um
+limite de envios simultâneos. Falhas são reenviadas com espera exponencial;
+depois de NOTIFICACAO_MAX_TENTATIVAS a mensagem vai para o status "morto".
+
+Uso:
+    python notificacoes.py            # roda continuamente
+    python notificacoes.py --uma-vez  # esvazia a fila e termina
+
+Canais novos são registrados com o decorator @canal('nome').
+"""
+
+import argparse
+import datetime
+import fcntl
+import json
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import fila_trabalho
+
+# Registro de canais: nome -> função enviar(destino, evento, payload, config)
+CANAIS = {}
+
+# Mensagens "enviando" há mais tempo que isso voltam para a fila
+# (o despachante que as pegou provavelmente morreu no meio do envio)
+PRAZO_ENVIO = datetime.timedelta(minutes=5)
+
+_trava_arquivo = threading.Lock()
+
+
+def canal(nome):
+    """Decorator que registra uma função de envio como canal de notificação."""
+    def registrar(funcao):
+        CANAIS[nome] = funcao
+        return funcao
+    return registrar
+
+
+@canal('arquivo')
+def enviar_arquivo(destino, evento, payload, config):
+    """Stub local: acrescenta a mensagem, em uma linha JSON, ao arquivo configurado."""
+    caminho = config['NOTIFICACAO_ARQUIVO']
+    if not os.path.isabs(caminho):
+        caminho = os.path.join(config['INSTANCE_PATH'], caminho)
+    linha = json.dumps({'destino': destino, 'evento': evento, 'payload': payload}, ensure_ascii=False)
+    with _trava_arquivo, open(caminho, 'a', encoding='utf-8') as arquivo:
+        # A mesma trava do job de exclusão de dados (LGPD), que reescreve o arquivo
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        arquivo.write(linha + '\n')
+
+
+@canal('webhook')
+def enviar_webhook(destino, evento, payload, config):
+    """POST em JSON para NOTIFICACAO_WEBHOOK_URL (ou para o destino, se for uma URL).
+
+    Serve também para SMS/WhatsApp através de um gateway HTTP do provedor.
+    """
+    url = destino if destino.startswith(('http://', 'https://')) else config['NOTIFICACAO_WEBHOOK_URL']
+    if not url:
+        raise RuntimeError('NOTIFICACAO_WEBHOOK_URL não configurada')
+    corpo = json.dumps({'destino': destino, 'evento': evento, 'payload': payload}).encode('utf-8')
+    requisicao = urllib.request.Request(url, data=corpo, method='POST',
+                                        headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(requisicao, timeout=10) as resposta:
+        if resposta.status >= 300:
+            raise RuntimeError(f'HTTP {resposta.status}')
+
+
+def reservar_lote(db, NotificacaoOutbox, tamanho):
+    """Marca até `tamanho` mensagens prontas como "enviando" e as retorna.
+
+    A reserva é um UPDATE condicional por mensagem, então dois despachantes
+    rodando ao mesmo tempo nunca pegam a mesma linha.
+    """
+    agora = datetime.datetime.utcnow()
+    fila_trabalho.devolver_abandonados(NotificacaoOutbox, 'enviando', PRAZO_ENVIO, agora)
+
+    candidatas = db.session.query(NotificacaoOutbox.id).filter(
+        NotificacaoOutbox.status == 'pendente',
+        NotificacaoOutbox.proxima_tentativa <= agora,
+    ).order_by(NotificacaoOutbox.id).limit(tamanho).all()
+
+    reservadas = [notificacao_id for (notificacao_id,) in candidatas
+                  if fila_trabalho.reservar(NotificacaoOutbox, notificacao_id, 'enviando', agora)]
+    db.session.commit()
+    if not reservadas:
+        return []
+    return NotificacaoOutbox.query.filter(NotificacaoOutbox.id.in_(reservadas)).all()
+
+
+def enviar(mensagem, config):
+    """Envia uma mensagem (canal, destino, evento, payload); retorna None ou o erro."""
+    nome_canal, destino, evento, payload = mensagem
+    funcao = CANAIS.get(nome_canal)
+    if funcao is None:
+        return f'canal desconhecido: {nome_canal}'
+    try:
+        funcao(destino, evento, json.loads(payload), config)
+        return None
+    except Exception as e:
+        return f'{type(e).__name__}: {e}'[:500]
+
+
+def despachar_lote(db, NotificacaoOutbox, config, executor):
+    """Envia um lote de mensagens em paralelo e registra o resultado. Retorna o tamanho do lote."""
+    lote = reservar_lote(db, NotificacaoOutbox, config['NOTIFICACAO_LOTE'])
+    if not lote:
+        return 0
+
+    # As threads recebem tuplas simples, nunca objetos da sessão do SQLAlchemy
+    mensagens = [(n.canal, n.destino, n.evento, n.payload) for n in lote]
+    erros = list(executor.map(lambda mensagem: enviar(mensagem, config), mensagens))
+
+    agora = datetime.datetime.utcnow()
+    for notificacao, erro in zip(lote, erros):
+        fila_trabalho.registrar_tentativa(notificacao, erro, config, 'NOTIFICACAO', 'enviado', 'morto', agora)
+        if erro is None:
+            notificacao.enviado_em = agora
+    db.session.commit()
+    return len(lote)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Despacha as notificações pendentes do outbox.')
+    parser.add_argument('--uma-vez', action='store_true', help='esvazia a fila uma vez e termina')
+    parser.add_argument('--intervalo', type=float, default=2.0,
+                        help='segundos entre consultas quando a fila está vazia (padrão: 2)')
+    args = parser.parse_args()
+
+    from app import app, db, NotificacaoOutbox, contexto_loja, criar_tabelas
+
+    config = dict(app.config, INSTANCE_PATH=app.instance_path)
+    with app.app_context():
+        criar_tabelas()
+    with ThreadPoolExecutor(max_workers=config['NOTIFICACAO_CONCORRENCIA']) as executor:
+        print('📨 Despachante de notificações iniciado')
+        while True:
+            # Cada loja tem seu próprio outbox; todas são drenadas a cada rodada
+            enviados = 0
+            for loja in config['LOJAS']:
+                with contexto_loja(loja):
+                    enviados += despachar_lote(db, NotificacaoOutbox, config, executor)
+            if enviados:
+                print(f'   ... {enviados} notificações processadas')
+                continue
+            if args.uma_vez:
+                break
+            time.sleep(args.intervalo)
+
+if __name__ == '__main__':
+    main()
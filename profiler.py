@@ -0,0 +1,131 @@
+"""
+Profiler por requisição da Pastelaria Web
+
+Dois modos:
+
+    amostragem  Uma thread auxiliar lê a pilha da thread da requisição a cada
+                poucos milissegundos (sys._current_frames) e conta as pilhas.
+                O resultado é gravado no formato "collapsed stacks" (.folded),
+                aceito por flamegraph.pl, speedscope e inferno. Custo baixo.
+    cprofile    cProfile determinístico; gera um arquivo .prof lido pelo
+                módulo pstats, snakeviz, flameprof etc. Mais detalhado e mais caro.
+
+Cada perfil vem acompanhado de um .json com rota, tempo e demais metadados.
+Este módulo não importa o app.
+"""
+
+import cProfile
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+
+class AmostradorPilha:
+    """Amostra periodicamente a pilha de uma thread e acumula as pilhas vistas."""
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self.alvo = threading.get_ident()
+        self.pilhas = collections.Counter()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.alvo)
+            pilha = []
+            while frame is not None:
+                codigo = frame.f_code
+                pilha.append(f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})')
+                frame = frame.f_back
+            if pilha:
+                self.pilhas[';'.join(reversed(pilha))] += 1
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+
+    def salvar(self, caminho):
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            for pilha, contagem in self.pilhas.most_common():
+                arquivo.write(f'{pilha} {contagem}\n')
+
+
+class PerfilCProfile:
+    """Adaptador do cProfile com a mesma interface do AmostradorPilha."""
+
+    def __init__(self):
+        self.perfil = cProfile.Profile()
+
+    def iniciar(self):
+        self.perfil.enable()
+
+    def parar(self):
+        self.perfil.disable()
+
+    def salvar(self, caminho):
+        self.perfil.dump_stats(caminho)
+
+
+EXTENSOES = {'amostragem': '.folded', 'cprofile': '.prof'}
+
+
+class Sessao:
+    """Um perfil em andamento: criado no início da requisição e salvo no final."""
+
+    def __init__(self, modo, intervalo):
+        self.modo = modo
+        self.inicio = time.time()
+        self._relogio = time.perf_counter()
+        self.coletor = AmostradorPilha(intervalo) if modo == 'amostragem' else PerfilCProfile()
+        self.coletor.iniciar()
+
+    def finalizar(self, pasta, metadados, maximo):
+        """Para a coleta e grava o perfil e os metadados; mantém só os `maximo` mais recentes."""
+        duracao = time.perf_counter() - self._relogio
+        self.coletor.parar()
+        os.makedirs(pasta, exist_ok=True)
+        nome = f'{time.strftime("%Y%m%d_%H%M%S", time.localtime(self.inicio))}_{uuid.uuid4().hex[:8]}'
+        arquivo = nome + EXTENSOES[self.modo]
+        self.coletor.salvar(os.path.join(pasta, arquivo))
+        metadados = dict(metadados, arquivo=arquivo, modo=self.modo, inicio=self.inicio,
+                         data=time.strftime('%d/%m/%Y %H:%M:%S', time.localtime(self.inicio)),
+                         duracao_ms=round(duracao * 1000, 2))
+        with open(os.path.join(pasta, nome + '.json'), 'w', encoding='utf-8') as saida:
+            json.dump(metadados, saida)
+        _limpar(pasta, maximo)
+
+
+def _limpar(pasta, maximo):
+    """Apaga os perfis mais antigos além de `maximo`."""
+    registros = sorted(n for n in os.listdir(pasta) if n.endswith('.json'))
+    for nome in registros[:-maximo] if maximo else []:
+        base = nome[:-len('.json')]
+        for extensao in ('.json', *EXTENSOES.values()):
+            try:
+                os.remove(os.path.join(pasta, base + extensao))
+            except FileNotFoundError:
+                pass
+
+
+def listar(pasta, limite):
+    """Metadados dos perfis salvos, do mais lento para o mais rápido."""
+    if not os.path.isdir(pasta):
+        return []
+    perfis = []
+    for nome in os.listdir(pasta):
+        if nome.endswith('.json'):
+            try:
+                with open(os.path.join(pasta, nome), encoding='utf-8') as arquivo:
+                    perfis.append(json.load(arquivo))
+            except (OSError, ValueError):
+                continue
+    perfis.sort(key=lambda perfil: perfil['duracao_ms'], reverse=True)
+    return perfis[:limite]
@@ -0,0 +1,186 @@
+"""
+Motor de promoções da Pastelaria Web
+
+As promoções ativas são compiladas em um índice produto -> regras. Para avaliar
+um carrinho, só as regras que tocam algum produto do carrinho são consideradas,
+então o custo cresce com o tamanho do carrinho e não com o número de promoções.
+A compilação só precisa ser refeita quando promoções ou produtos mudam.
+
+Tipos de regra (campo `regra`, em JSON):
+
+    combo   {"componentes": [{"categorias": ["Pastel Salgado"], "quantidade": 1},
+                             {"produtos": [6], "quantidade": 1}],
+             "preco": 12.0}
+            Cada conjunto de itens que forma o combo sai pelo preço fixo.
+
+    leve_n  {"alvo": {"categorias": ["Pastel Doce"]}, "n": 3, "desconto": 50}
+            A cada `n` unidades do alvo, a mais barata sai com `desconto`% off.
+
+Este módulo não importa o app; recebe as regras e o catálogo já carregados.
+"""
+
+TIPOS = {
+    'combo': 'Combo com preço fixo',
+    'leve_n': 'Desconto na N-ésima unidade',
+}
+
+
+def _validar_alvo(alvo):
+    if not isinstance(alvo, dict) or not (alvo.get('produtos') or alvo.get('categorias')):
+        raise ValueError('Cada alvo precisa de "produtos" e/ou "categorias".')
+    if not all(isinstance(p, int) for p in alvo.get('produtos', [])):
+        raise ValueError('"produtos" deve ser uma lista de ids.')
+    if not all(isinstance(c, str) for c in alvo.get('categorias', [])):
+        raise ValueError('"categorias" deve ser uma lista de nomes.')
+
+
+def validar_regra(tipo, regra):
+    """Valida a regra de uma promoção; levanta ValueError com a mensagem para o admin."""
+    if tipo == 'combo':
+        componentes = regra.get('componentes')
+        if not isinstance(componentes, list) or not componentes:
+            raise ValueError('O combo precisa de uma lista de "componentes".')
+        for componente in componentes:
+            _validar_alvo(componente)
+            if not isinstance(componente.get('quantidade', 1), int) or componente.get('quantidade', 1) < 1:
+                raise ValueError('"quantidade" de cada componente deve ser um inteiro positivo.')
+        if not isinstance(regra.get('preco'), (int, float)) or regra['preco'] < 0:
+            raise ValueError('O combo precisa de um "preco" válido.')
+    elif tipo == 'leve_n':
+        _validar_alvo(regra.get('alvo'))
+        if not isinstance(regra.get('n'), int) or regra['n'] < 1:
+            raise ValueError('"n" deve ser um inteiro positivo.')
+        if not isinstance(regra.get('desconto'), (int, float)) or not 0 < regra['desconto'] <= 100:
+            raise ValueError('"desconto" deve ser um percentual entre 0 e 100.')
+    else:
+        raise ValueError(f'Tipo de promoção desconhecido: {tipo}')
+
+
+def _resolver(alvo, por_categoria):
+    """Conjunto de ids de produto cobertos por um alvo {"produtos", "categorias"}."""
+    ids = set(alvo.get('produtos', []))
+    for categoria in alvo.get('categorias', []):
+        ids.update(por_categoria.get(categoria, ()))
+    return frozenset(ids)
+
+
+class _Combo:
+    def __init__(self, ordem, nome, regra, por_categoria):
+        self.ordem = ordem
+        self.nome = nome
+        self.componentes = [(_resolver(c, por_categoria), c.get('quantidade', 1)) for c in regra['componentes']]
+        self.preco = float(regra['preco'])
+        self.produtos = frozenset().union(*(ids for ids, _ in self.componentes))
+
+    def aplicar(self, restante, precos):
+        """Monta combos enquanto houver itens e o combo sair mais barato; consome as unidades usadas."""
+        # Para cada componente, os produtos do carrinho que o atendem, do mais caro ao mais barato
+        opcoes = [(sorted((p for p in restante if p in ids), key=lambda p: -precos[p]), quantidade)
+                  for ids, quantidade in self.componentes]
+        desconto = 0.0
+        while True:
+            usados = {}
+            valor = 0.0
+            for produtos, quantidade in opcoes:
+                faltam = quantidade
+                for produto_id in produtos:
+                    livres = restante[produto_id] - usados.get(produto_id, 0)
+                    pega = min(livres, faltam)
+                    if pega > 0:
+                        usados[produto_id] = usados.get(produto_id, 0) + pega
+                        valor += precos[produto_id] * pega
+                        faltam -= pega
+                        if not faltam:
+                            break
+                if faltam:
+                    return desconto
+            if valor <= self.preco:
+                return desconto
+            for produto_id, quantidade in usados.items():
+                restante[produto_id] -= quantidade
+            desconto += valor - self.preco
+
+
+class _LeveN:
+    def __init__(self, ordem, nome, regra, por_categoria):
+        self.ordem = ordem
+        self.nome = nome
+        self.produtos = _resolver(regra['alvo'], por_categoria)
+        self.n = regra['n']
+        self.fator = regra['desconto'] / 100.0
+
+    def aplicar(self, restante, precos):
+        """A cada n unidades do alvo, desconta a mais barata; consome as unidades agrupadas."""
+        alvo = sorted((p for p in restante if restante[p] and p in self.produtos), key=lambda p: precos[p])
+        total = sum(restante[p] for p in alvo)
+        grupos = total // self.n
+        if not grupos:
+            return 0.0
+        # As `grupos` unidades mais baratas recebem o desconto...
+        desconto = 0.0
+        faltam = grupos
+        for produto_id in alvo:
+            pega = min(restante[produto_id], faltam)
+            desconto += precos[produto_id] * pega * self.fator
+            restante[produto_id] -= pega
+            faltam -= pega
+            if not faltam:
+                break
+        # ...e as demais unidades de cada grupo (as mais caras) ficam reservadas
+        faltam = grupos * (self.n - 1)
+        for produto_id in reversed(alvo):
+            pega = min(restante[produto_id], faltam)
+            restante[produto_id] -= pega
+            faltam -= pega
+            if not faltam:
+                break
+        return desconto
+
+
+_CLASSES = {'combo': _Combo, 'leve_n': _LeveN}
+
+
+class MotorPromocoes:
+    """Promoções compiladas e indexadas por produto."""
+
+    def __init__(self, regras, catalogo):
+        """`regras`: lista de (id, nome, tipo, regra); `catalogo`: {produto_id: categoria}."""
+        por_categoria = {}
+        for produto_id, categoria in catalogo.items():
+            por_categoria.setdefault(categoria, []).append(produto_id)
+        self.indice = {}
+        for promocao_id, nome, tipo, regra in regras:
+            compilada = _CLASSES[tipo](promocao_id, nome, regra, por_categoria)
+            for produto_id in compilada.produtos:
+                self.indice.setdefault(produto_id, []).append(compilada)
+
+    def avaliar(self, itens):
+        """Calcula os totais de um carrinho.
+
+        `itens`: lista de (produto_id, preco_unitario, quantidade). Retorna
+        {'subtotal', 'descontos': [{'promocao', 'valor'}], 'desconto', 'total'}.
+        """
+        restante = {}
+        precos = {}
+        subtotal = 0.0
+        for produto_id, preco, quantidade in itens:
+            restante[produto_id] = restante.get(produto_id, 0) + quantidade
+            precos[produto_id] = preco
+            subtotal += preco * quantidade
+
+        candidatas = {}
+        for produto_id in restante:
+            for regra in self.indice.get(produto_id, ()):
+                candidatas[regra.ordem] = regra
+
+        descontos = []
+        for ordem in sorted(candidatas):
+            regra = candidatas[ordem]
+            valor = round(regra.aplicar(restante, precos), 2)
+            if valor > 0:
+                descontos.append({'promocao': regra.nome, 'valor': valor})
+
+        desconto = round(sum(d['valor'] for d in descontos), 2)
+        subtotal = round(subtotal, 2)
+        return {'subtotal': subtotal, 'descontos': descontos, 'desconto': desconto,
+                'total': round(subtotal - desconto, 2)}
@@ -0,0 +1,70 @@
+"""
+Limitador de tentativas (token bucket) compartilhado entre os workers do gunicorn
+
+Os baldes ficam em um arquivo SQLite próprio, separado do banco principal,
+para que as tentativas de login nunca disputem o lock de escrita com o
+checkout. Cada verificação é um único UPSERT atômico: o balde é reabastecido
+pelo tempo decorrido e só perde uma ficha se ainda tiver ao menos uma.
+"""
+
+import os
+import random
+import sqlite3
+import threading
+import time
+
+# Baldes sem uso há mais tempo que isso são apagados de vez em quando
+EXPIRACAO_SEGUNDOS = 24 * 3600
+
+_SQL_CONSUMIR = """
+INSERT INTO baldes (chave, fichas, atualizado) VALUES (:chave, :capacidade - 1, :agora)
+ON CONFLICT(chave) DO UPDATE SET
+    fichas = MIN(:capacidade, fichas + (:agora - atualizado) * :taxa) - 1,
+    atualizado = :agora
+WHERE MIN(:capacidade, fichas + (:agora - atualizado) * :taxa) >= 1
+"""
+
+
+class LimitadorTaxa:
+    """Token bucket persistido em SQLite; seguro entre processos e threads."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._local = threading.local()
+
+    def _conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        # Reabre a conexão depois de um fork (cada worker tem a sua)
+        if conexao is None or self._local.pid != os.getpid():
+            conexao = sqlite3.connect(self.caminho, timeout=0.5, isolation_level=None)
+            conexao.execute('PRAGMA journal_mode = WAL')
+            conexao.execute('PRAGMA synchronous = OFF')
+            conexao.execute('CREATE TABLE IF NOT EXISTS baldes ('
+                            'chave TEXT PRIMARY KEY, fichas REAL NOT NULL, atualizado REAL NOT NULL)')
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+
+    def permitir(self, chave, capacidade, janela):
+        """Consome uma ficha do balde `chave`; retorna False se o limite foi atingido.
+
+        `capacidade` tentativas são liberadas a cada `janela` segundos.
+        Em caso de erro no arquivo de limites a tentativa é permitida.
+        """
+        agora = time.time()
+        try:
+            conexao = self._conexao()
+            cursor = conexao.execute(_SQL_CONSUMIR, {
+                'chave': chave, 'capacidade': capacidade, 'taxa': capacidade / janela, 'agora': agora})
+            if random.random() < 0.001:
+                conexao.execute('DELETE FROM baldes WHERE atualizado < ?', (agora - EXPIRACAO_SEGUNDOS,))
+            return cursor.rowcount == 1
+        except sqlite3.Error:
+            return True
+
+    def apagar(self, chaves):
+        """Remove os baldes das chaves, ex.: os do telefone de um cliente que excluiu seus dados."""
+        try:
+            self._conexao().executemany('DELETE FROM baldes WHERE chave = ?', [(chave,) for chave in chaves])
+        except sqlite3.Error:
+            pass # os baldes expiram sozinhos em EXPIRACAO_SEGUNDOS
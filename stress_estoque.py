@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Teste de concorrência da baixa de estoque no checkout
+
+Cria um banco SQLite temporário com um produto de estoque limitado e dispara
+vários checkouts simultâneos (uma thread por cliente) disputando as últimas
+unidades. Falha (código de saída 1) se alguma unidade for vendida além do
+estoque, se os pedidos gravados não baterem com o estoque descontado, se
+nenhum pedido for aceito ou se sobrar estoque quando a demanda o excede.
+
+Uso:
+    python stress_estoque.py --clientes 50 --estoque 7
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dispara checkouts simultâneos disputando o mesmo estoque.')
+    parser.add_argument('--clientes', type=int, default=40, help='checkouts simultâneos (padrão: 40)')
+    parser.add_argument('--estoque', type=int, default=7, help='unidades disponíveis (padrão: 7)')
+    args = parser.parse_args()
+
+    # Banco temporário definido antes de importar o app (mesmo esquema do init_simple.py)
+    pasta = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(pasta, "stress.db")}'
+    os.environ['FLASK_ENV'] = 'development'  # o TestingConfig usaria um banco em memória
+    # Cozinha aberta o dia todo e com capacidade para todos: só o estoque limita as vendas
+    os.environ['AGENDA_ABERTURA'] = '00:00'
+    os.environ['AGENDA_FECHAMENTO'] = '24:00'
+    os.environ['AGENDA_CAPACIDADE_PADRAO'] = str(2 * args.clientes)
+
+    from app import app, db, Cliente, Produto, Pedido, itens_pedido, criar_tabelas, janela_horarios
+
+    app.config['NOTIFICACAO_CANAL_CLIENTE'] = app.config['NOTIFICACAO_CANAL_LOJA'] = ''
+    with app.app_context():
+        criar_tabelas()
+        produto = Produto(nome='Pastel de Catupiry', preco=9.0, categoria='Pastel Salgado', estoque=args.estoque)
+        db.session.add(produto)
+        for i in range(args.clientes):
+            cliente = Cliente(nome=f'Cliente {i}', telefone=f'1190000{i:04d}', endereco='Rua A', consentimento_lgpd=True)
+            cliente.senha_hash = 'x'  # login é feito direto na sessão
+            db.session.add(cliente)
+        db.session.commit()
+        produto_id = produto.id
+        ids_clientes = [c.id for c in Cliente.query.all()]
+    # Todos escolhem o primeiro horário disponível e retiram na loja
+    formulario = {'horario': janela_horarios()[0].strftime('%Y-%m-%dT%H:%M'), 'modo': 'retirada'}
+
+    # Cada cliente coloca 1 ou 2 unidades no carrinho
+    clientes = []
+    for indice, cliente_id in enumerate(ids_clientes):
+        cliente_http = app.test_client()
+        quantidade = 1 + indice % 2
+        with cliente_http.session_transaction() as sessao:
+            sessao['cliente_id'] = cliente_id
+            sessao['cliente_nome'] = f'Cliente {indice}'
+            sessao['carrinho'] = {str(produto_id): {'nome': 'Pastel de Catupiry', 'preco': 9.0,
+                                                    'quantidade': quantidade}}
+        clientes.append(cliente_http)
+
+    largada = threading.Barrier(len(clientes))
+
+    def checkout(cliente_http):
+        largada.wait()
+        cliente_http.post('/finalizar_pedido', data=formulario)
+
+    threads = [threading.Thread(target=checkout, args=(c,)) for c in clientes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        estoque_final = db.session.get(Produto, produto_id).estoque
+        vendidos = db.session.execute(
+            db.select(db.func.coalesce(db.func.sum(itens_pedido.c.quantidade), 0))
+            .where(itens_pedido.c.produto_id == produto_id)).scalar()
+        pedidos = Pedido.query.count()
+
+    print(f'Pedidos aceitos: {pedidos} | unidades vendidas: {vendidos} | estoque final: {estoque_final}')
+    if estoque_final < 0 or vendidos > args.estoque or vendidos != args.estoque - estoque_final:
+        print('❌ Estoque inconsistente: houve venda além do disponível.')
+        sys.exit(1)
+    if pedidos == 0:
+        print('❌ Nenhum pedido foi aceito: o checkout falhou para todos os clientes.')
+        sys.exit(1)
+    # Com pelo menos tantos carrinhos de 1 unidade quanto o estoque, a demanda o
+    # esgota em qualquer ordem: sobrar uma unidade seria uma venda recusada sem motivo
+    if len(range(0, args.clientes, 2)) >= args.estoque and vendidos != args.estoque:
+        print(f'❌ A demanda excedia o estoque, mas só {vendidos} de {args.estoque} unidades foram vendidas.')
+        sys.exit(1)
+    print('✅ Nenhuma unidade vendida além do estoque.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+// Service worker da Pastelaria Web (gerado pela rota /sw.js)
+//
+// Estáticos: cache-first. As URLs levam ?v=<versão dos arquivos>, então um
+// deploy que altera o CSS gera URLs (e um cache) novos.
+// Cardápio: stale-while-revalidate. A cópia guardada abre na hora (inclusive
+// offline) e é revalidada em segundo plano com If-None-Match; o servidor só
+// devolve o HTML de novo quando a versão do cardápio mudou.
+// Todo o resto (carrinho, checkout, login, admin) vai sempre para a rede.
+
+const VERSAO = {{ versao|tojson }};
+const CACHE_ESTATICOS = 'pastelaria-estaticos-' + VERSAO;
+const CACHE_CARDAPIO = 'pastelaria-cardapio';
+const ESTATICOS = {{ estaticos|tojson }};
+const PREFIXO_ESTATICOS = new URL({{ prefixo_estaticos|tojson }}, self.location).pathname;
+const CARDAPIO = new URL({{ cardapio|tojson }}, self.location).href;
+
+self.addEventListener('install', (event) => {
+    event.waitUntil(
+        caches.open(CACHE_ESTATICOS)
+            .then((cache) => cache.addAll(ESTATICOS))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', (event) => {
+    // Apaga os estáticos de versões anteriores
+    event.waitUntil(
+        caches.keys()
+            .then((nomes) => Promise.all(nomes
+                .filter((nome) => nome.startsWith('pastelaria-estaticos-') && nome !== CACHE_ESTATICOS)
+                .map((nome) => caches.delete(nome))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', (event) => {
+    const requisicao = event.request;
+    if (requisicao.method !== 'GET') {
+        return;
+    }
+    const url = new URL(requisicao.url);
+    if (url.origin !== self.location.origin) {
+        return;
+    }
+    if (url.pathname.startsWith(PREFIXO_ESTATICOS)) {
+        event.respondWith(primeiroDoCache(requisicao));
+    } else if (url.href === CARDAPIO) {
+        event.respondWith(cardapioRevalidado(event));
+    }
+});
+
+async function primeiroDoCache(requisicao) {
+    const guardada = await caches.match(requisicao);
+    if (guardada) {
+        return guardada;
+    }
+    const resposta = await fetch(requisicao);
+    if (resposta.ok) {
+        const cache = await caches.open(CACHE_ESTATICOS);
+        await cache.put(requisicao, resposta.clone());
+    }
+    return resposta;
+}
+
+async function cardapioRevalidado(event) {
+    const cache = await caches.open(CACHE_CARDAPIO);
+    const guardada = await cache.match(CARDAPIO);
+    const etag = guardada && guardada.headers.get('ETag');
+
+    const atualizacao = fetch(CARDAPIO, {
+        credentials: 'same-origin',
+        headers: etag ? { 'If-None-Match': etag } : {},
+    }).then(async (resposta) => {
+        // 304: a cópia guardada continua valendo
+        if (resposta.status === 200) {
+            await cache.put(CARDAPIO, resposta.clone());
+            if (guardada) {
+                avisarCardapioAtualizado();
+            }
+        }
+        return resposta;
+    });
+
+    if (guardada) {
+        event.waitUntil(atualizacao.catch(() => {}));
+        return guardada;
+    }
+    return atualizacao;
+}
+
+async function avisarCardapioAtualizado() {
+    const janelas = await self.clients.matchAll({ type: 'window' });
+    janelas.forEach((janela) => janela.postMessage('cardapio-atualizado'));
+}
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Teste da fila de impressão dos tickets da cozinha
+
+Cria um banco SQLite temporário, sobe o impressora_local.py em uma porta livre
+e enfileira tickets de vários pedidos. Verifica o ESC/POS gerado pelo
+renderizar_ticket, a ordem estrita de impressão, a nova tentativa com espera
+exponencial quando a impressora recusa a conexão, o status "erro" depois de
+IMPRESSAO_MAX_TENTATIVAS e a reimpressão pelo admin. Falha (código de saída 1)
+na primeira verificação que não passar.
+
+Uso:
+    python teste_impressao.py --tickets 5
+"""
+
+import argparse
+import datetime
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+
+def verificar(condicao, mensagem):
+    if not condicao:
+        print(f'❌ {mensagem}')
+        sys.exit(1)
+    print(f'✅ {mensagem}')
+
+
+def porta_fechada():
+    """Uma porta local em que ninguém escuta (a conexão é recusada)."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Testa a fila de impressão contra uma impressora local.')
+    parser.add_argument('--tickets', type=int, default=5, help='pedidos enfileirados (padrão: 5)')
+    args = parser.parse_args()
+
+    # Banco temporário definido antes de importar o app (mesmo esquema do stress_estoque.py)
+    pasta = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(pasta, "impressao.db")}'
+    os.environ['FLASK_ENV'] = 'development'  # o TestingConfig usaria um banco em memória
+
+    import impressao
+    from app import (app, db, Cliente, Pedido, TicketImpressao, LOJA_PADRAO, contexto_loja,
+                     criar_tabelas, enfileirar_ticket)
+    from impressora_local import ImpressoraLocal, texto_do_ticket
+
+    impressora = ImpressoraLocal(('127.0.0.1', 0), mostrar=False)
+    threading.Thread(target=impressora.serve_forever, daemon=True).start()
+    destino = f'tcp://127.0.0.1:{impressora.server_address[1]}'
+    recusado = f'tcp://127.0.0.1:{porta_fechada()}'
+
+    app.config['NOTIFICACAO_CANAL_CLIENTE'] = app.config['NOTIFICACAO_CANAL_LOJA'] = ''
+    if not os.environ.get('IMPRESSORAS') and not os.environ.get('IMPRESSORA_PADRAO'):
+        verificar(not impressao.destino_da_loja(LOJA_PADRAO, app.config),
+                  'sem impressora configurada a impressão fica desativada')
+    app.config['IMPRESSORAS'] = {LOJA_PADRAO: destino}
+    # Esperas curtas para o teste não demorar
+    config = dict(app.config, INSTANCE_PATH=app.instance_path, IMPRESSAO_TIMEOUT=1,
+                  IMPRESSAO_ESPERA_BASE=0.05, IMPRESSAO_ESPERA_MAXIMA=0.2, IMPRESSAO_MAX_TENTATIVAS=3)
+
+    def imprimir(endereco_destino):
+        with contexto_loja(LOJA_PADRAO):
+            return impressao.imprimir_proximo(db, TicketImpressao, endereco_destino, config)
+
+    def ticket(ticket_id):
+        with contexto_loja(LOJA_PADRAO):
+            return db.session.get(TicketImpressao, ticket_id)
+
+    def aguardar_tentativa(ticket_id):
+        espera = (ticket(ticket_id).proxima_tentativa - datetime.datetime.utcnow()).total_seconds()
+        time.sleep(max(espera, 0) + 0.01)
+
+    def recebidos(quantidade):
+        """Texto dos tickets recebidos pela impressora (o handler roda em outra thread)."""
+        limite = time.monotonic() + 5
+        while len(impressora.tickets) < quantidade and time.monotonic() < limite:
+            time.sleep(0.01)
+        return [texto_do_ticket(dados) for dados in impressora.tickets]
+
+    with app.app_context():
+        criar_tabelas()
+        cliente = Cliente(nome='Cliente Teste', telefone='11999990000', endereco='Rua A, 1', is_admin=True)
+        cliente.set_senha('teste')
+        db.session.add(cliente)
+        db.session.commit()
+        cliente_id = cliente.id
+
+    with contexto_loja(LOJA_PADRAO):
+        pedidos = [Pedido(cliente_id=cliente_id, valor_total=10.0 + i, entrega=False) for i in range(args.tickets)]
+        db.session.add_all(pedidos)
+        for pedido in pedidos:
+            enfileirar_ticket(pedido)
+        db.session.commit()
+        ids_pedidos = [pedido.id for pedido in pedidos]
+        ids_tickets = [t.id for t in TicketImpressao.query.order_by(TicketImpressao.id)]
+        dados = json.loads(db.session.get(TicketImpressao, ids_tickets[0]).dados)
+    verificar(len(ids_tickets) == args.tickets, f'{args.tickets} tickets enfileirados')
+
+    # ESC/POS
+    bruto = impressao.renderizar_ticket(dados, False, config['IMPRESSORA_COLUNAS'])
+    verificar(bruto.startswith(impressao.ESC_INICIAR) and bruto.endswith(impressao.GS_AVANCAR_E_CORTAR),
+              'ticket começa inicializando a impressora e termina com avanço e corte')
+    verificar(f'PEDIDO #{ids_pedidos[0]}'.encode() in bruto and 'RETIRADA NA LOJA'.encode('cp860') in bruto,
+              'ticket traz o número do pedido e o endereço em CP860')
+    verificar('REIMPRESSÃO' not in texto_do_ticket(bruto) and
+              'REIMPRESSÃO' in texto_do_ticket(impressao.renderizar_ticket(dados, True, 32)),
+              'só a reimpressão leva a marca de reimpressão')
+    largura = max(len(linha) for linha in texto_do_ticket(bruto).splitlines())
+    verificar(largura <= config['IMPRESSORA_COLUNAS'], f'nenhuma linha passa de {config["IMPRESSORA_COLUNAS"]} colunas')
+
+    # Conexão recusada: nova tentativa com espera, e os seguintes aguardam
+    antes = datetime.datetime.utcnow()
+    verificar(not imprimir(recusado), 'conexão recusada não conta como impresso')
+    primeiro = ticket(ids_tickets[0])
+    verificar(primeiro.status == 'pendente' and primeiro.tentativas == 1 and primeiro.ultimo_erro
+              and primeiro.proxima_tentativa > antes, 'ticket volta para a fila com a próxima tentativa agendada')
+    verificar(not imprimir(destino) and ticket(ids_tickets[1]).tentativas == 0 and not impressora.tickets,
+              'durante a espera nenhum ticket é impresso fora de ordem')
+    esperas = [impressao.calcular_espera(n, config).total_seconds() for n in range(1, 4)]
+    verificar(esperas[0] < esperas[1] < esperas[2] <= config['IMPRESSAO_ESPERA_MAXIMA'] * 1.2,
+              'a espera dobra a cada falha até o máximo')
+
+    # Impressora de volta: todos saem, na ordem da fila
+    aguardar_tentativa(ids_tickets[0])
+    while imprimir(destino):
+        pass
+    textos = recebidos(args.tickets)
+    verificar(len(textos) == args.tickets and
+              all(f'PEDIDO #{pedido_id}\n' in texto for pedido_id, texto in zip(ids_pedidos, textos)),
+              'tickets impressos estritamente na ordem da fila')
+    verificar(all(ticket(ticket_id).status == 'impresso' for ticket_id in ids_tickets), 'todos marcados como impressos')
+
+    # Falhas seguidas: status "erro" depois de IMPRESSAO_MAX_TENTATIVAS
+    with contexto_loja(LOJA_PADRAO):
+        enfileirar_ticket(db.session.get(Pedido, ids_pedidos[0]))
+        db.session.commit()
+        id_erro = TicketImpressao.query.order_by(TicketImpressao.id.desc()).first().id
+    for _ in range(config['IMPRESSAO_MAX_TENTATIVAS']):
+        aguardar_tentativa(id_erro)
+        imprimir(recusado)
+    falho = ticket(id_erro)
+    verificar(falho.status == 'erro' and falho.tentativas == config['IMPRESSAO_MAX_TENTATIVAS'],
+              f'ticket vai para "erro" depois de {config["IMPRESSAO_MAX_TENTATIVAS"]} tentativas')
+    verificar(not imprimir(destino), 'ticket com erro sai da fila')
+
+    # Reimpressão pelo admin
+    admin_http = app.test_client()
+    with admin_http.session_transaction() as sessao:
+        sessao['cliente_id'] = cliente_id
+        sessao['is_admin'] = True
+    admin_http.post(f'/admin/pedido/{ids_pedidos[0]}/reimprimir')
+    verificar(imprimir(destino), 'reimpressão entra na fila e é impressa')
+    texto = recebidos(args.tickets + 1)[-1]
+    verificar(len(impressora.tickets) == args.tickets + 1 and 'REIMPRESSÃO' in texto
+              and f'PEDIDO #{ids_pedidos[0]}' in texto, 'impressora recebe a via marcada como reimpressão')
+
+    impressora.shutdown()
+    impressora.server_close()
+
+
+if __name__ == '__main__':
+    main()